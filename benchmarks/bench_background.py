@@ -0,0 +1,68 @@
+"""
+Accuracy and speed of the background estimators in src.background on a
+synthetic scan with a known curved background, compared with powerxrd's
+Chart.backsub when powerxrd is installed. Also times a stack of patterns.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_background
+    python -m benchmarks.bench_background --step 0.08 --patterns 1000
+"""
+
+import argparse
+import time
+import numpy as np
+from src.background import BACKGROUNDS, estimate_background
+
+def synthetic_scan(step, rng):
+    """
+    Gaussian peaks (100-2000 counts, FWHM 0.35°) on a decaying, curved
+    background with Poisson noise.
+    Returns:
+      two_theta, counts, true background.
+    """
+    two_theta = np.arange(10, 80, step)
+    background = 200 * np.exp(-(two_theta - 10) / 20) + 50 + 0.01 * (two_theta - 40)**2
+    peaks = sum(a * np.exp(-0.5 * ((two_theta - c) / 0.15)**2)
+                for a, c in zip(rng.uniform(100, 2000, 15), rng.uniform(12, 78, 15)))
+    return two_theta, rng.poisson(background + peaks).astype(float), background
+
+def timed(function, repeats=5):
+    """
+    Result and best-of-repeats runtime of function().
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark background estimation.")
+    parser.add_argument('--step', type=float, default=0.02)
+    parser.add_argument('--patterns', type=int, default=200)
+    args = parser.parse_args()
+
+    two_theta, counts, truth = synthetic_scan(args.step, np.random.default_rng(0))
+    stack = np.tile(counts, (args.patterns, 1))
+    print(f"{len(two_theta)} points; background error in counts")
+    print(f"{'method':<14} {'bias':>7} {'RMS':>7} {'ms/pattern':>11} {'ms/pattern (stack)':>19}")
+    for method in BACKGROUNDS:
+        background, single = timed(lambda: estimate_background(two_theta, counts, method))
+        _, stacked = timed(lambda: estimate_background(two_theta, stack, method), repeats=1)
+        error = background - truth
+        print(f"{method:<14} {error.mean():>7.2f} {np.sqrt(np.mean(error**2)):>7.2f} "
+              f"{1e3 * single:>11.3f} {1e3 * stacked / args.patterns:>19.3f}")
+
+    try:
+        import powerxrd as xrd
+    except ImportError:
+        print("powerxrd is not installed; Chart.backsub skipped.")
+        return
+    (_, subtracted), single = timed(lambda: xrd.Chart(two_theta.copy(), counts.copy()).backsub(tol=1.0))
+    error = counts - subtracted - truth
+    print(f"{'Chart.backsub':<14} {error.mean():>7.2f} {np.sqrt(np.mean(error**2)):>7.2f} "
+          f"{1e3 * single:>11.3f} {'':>19}")
+
+if __name__ == "__main__":
+    main()
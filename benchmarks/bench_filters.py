@@ -0,0 +1,82 @@
+"""
+Benchmark and accuracy harness for the outlier filters in src.filters.
+
+For every raw file in samples/ it reports the runtime of each filter and how
+many points it rejects. On a synthetic scan with known spikes it also reports
+how many spikes each filter catches and how many clean points it rejects.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_filters
+    python -m benchmarks.bench_filters --samples path/to/raw --points 1000000
+"""
+
+import argparse
+import glob
+import os
+import time
+import numpy as np
+from src.data_cleaner import DEFAULT_PARAMS
+from src.filters import FILTERS
+from src.xy_reader import read_xy
+
+def run_filter(name, intensity, repeats=3):
+    """
+    Best-of-repeats runtime of a filter with the default cleaning parameters.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        keep = FILTERS[name](intensity, DEFAULT_PARAMS['window_size'],
+                             DEFAULT_PARAMS['threshold_multiplier'], DEFAULT_PARAMS['epsilon'])
+        times.append(time.perf_counter() - start)
+    return keep, min(times)
+
+def synthetic_scan(n, seed=0):
+    """
+    Pseudo-Voigt-like peaks on a decaying background with Poisson noise, plus
+    positive and negative spikes of 1, 2 and 3 points at known positions.
+    Returns:
+      two_theta, intensity, spike_mask.
+    """
+    rng = np.random.default_rng(seed)
+    two_theta = np.linspace(10, 60, n)
+    clean = 2000 * np.exp(-two_theta / 20)
+    for center in (20, 23, 33, 39, 41):
+        clean += 5e4 / (1 + ((two_theta - center) / 0.08)**2)
+    intensity = rng.poisson(clean).astype(float)
+    spikes = np.zeros(n, dtype=bool)
+    # Spike starts on a coarse grid so that spikes never touch each other.
+    starts = 10 * rng.choice(np.arange(1, n // 10 - 1), size=max(1, n // 1000), replace=False)
+    widths = 1 + np.arange(len(starts)) % 3
+    for i, (start, width) in enumerate(zip(starts, widths)):
+        spikes[start:start + width] = True
+        intensity[start:start + width] *= 20 if i % 2 == 0 else 0.02  # hot / dead pixels
+    return two_theta, intensity, spikes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the outlier filters.")
+    parser.add_argument('--samples', default='samples', help="Directory with Sample*.txt raw files.")
+    parser.add_argument('--points', type=int, default=100_000, help="Points in the synthetic scan.")
+    args = parser.parse_args()
+
+    print(f"{'file':<24} {'filter':<14} {'points':>9} {'rejected':>9} {'time (ms)':>10}")
+    for raw_file in sorted(glob.glob(os.path.join(args.samples, "Sample*.txt"))):
+        two_theta, intensity = read_xy(raw_file)
+        intensity = intensity[two_theta > DEFAULT_PARAMS['min_two_theta']]
+        for name in FILTERS:
+            keep, elapsed = run_filter(name, intensity)
+            print(f"{os.path.basename(raw_file):<24} {name:<14} {intensity.size:>9} "
+                  f"{np.count_nonzero(~keep):>9} {1e3 * elapsed:>10.2f}")
+
+    _, intensity, spikes = synthetic_scan(args.points)
+    print(f"\nSynthetic scan: {args.points} points, {np.count_nonzero(spikes)} spike points "
+          f"in spikes of 1-3 points")
+    print(f"{'filter':<14} {'spikes caught':>14} {'clean rejected':>15} {'time (ms)':>10}")
+    for name in FILTERS:
+        keep, elapsed = run_filter(name, intensity)
+        caught = np.count_nonzero(~keep & spikes)
+        false_rejects = np.count_nonzero(~keep & ~spikes)
+        print(f"{name:<14} {caught:>14} {false_rejects:>15} {1e3 * elapsed:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark of the vectorized Hampel filter against the original pandas
+rolling(...).apply(lambda) implementation used by clean_data.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_hampel
+    python -m benchmarks.bench_hampel --sizes 10000 100000
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.data_cleaner import hampel_mask
+
+def pandas_mask(intensity, window_size=5, threshold_multiplier=3, epsilon=1e-6):
+    """
+    The original pandas implementation, kept here as the reference.
+    """
+    s = pd.Series(intensity)
+    rolling_median = s.rolling(window=window_size, center=True).median()
+    rolling_mad = s.rolling(window=window_size, center=True).apply(
+        lambda x: np.median(np.abs(x - np.median(x))), raw=True
+    )
+    difference = np.abs(s - rolling_median)
+    return (difference <= threshold_multiplier * (rolling_mad + epsilon)).to_numpy()
+
+def synthetic_scan(n, seed=0):
+    """
+    Gaussian peaks on a decaying background with Poisson noise and dead-pixel spikes.
+    """
+    rng = np.random.default_rng(seed)
+    two_theta = np.linspace(10, 60, n)
+    intensity = 2000 * np.exp(-two_theta / 20)
+    for center in (20, 23, 33, 39, 41):
+        intensity += 5e4 * np.exp(-0.5 * ((two_theta - center) / 0.05)**2)
+    intensity = rng.poisson(intensity).astype(float)
+    spikes = rng.choice(n, size=max(1, n // 1000), replace=False)
+    intensity[spikes] *= 20
+    return intensity
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Hampel filter engines.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'points':>10} {'pandas (s)':>12} {'numpy (s)':>12} {'speedup':>9} {'same mask':>10}")
+    for n in args.sizes:
+        intensity = synthetic_scan(n)
+        ref, t_pandas = timed(pandas_mask, intensity)
+        new, t_numpy = timed(hampel_mask, intensity)
+        same = np.array_equal(ref, new)
+        print(f"{n:>10} {t_pandas:>12.4f} {t_numpy:>12.4f} {t_pandas / t_numpy:>8.1f}x {str(same):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Instrument calibration (src.instrument): a synthetic standard scan with peak
+widths following known Caglioti parameters is profile-fitted and reduced to
+U, V and W, which are compared with the true ones. Then the time of loading
+the cached model is compared with refitting the standard, the cost the cache
+saves on every later size calculation.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_instrument
+    python -m benchmarks.bench_instrument --noise 0.02 --repeats 200
+"""
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from src.instrument import fit_caglioti, load_instrument, save_instrument
+from src.profiles import fit_peaks
+
+# LaB6 lines for Cu Kα1 (degrees 2θ) and Caglioti parameters in deg².
+PEAKS = np.array([21.36, 30.38, 37.44, 43.51, 48.96, 53.99, 63.22, 67.55, 71.74, 75.85, 79.84,
+                  87.69, 91.58, 95.51, 99.54, 103.69, 108.04, 112.66, 117.64, 123.13])
+TRUE_UVW = (0.004, -0.002, 0.003)
+
+def synthetic_standard(noise, rng, step=0.02):
+    """
+    Pseudo-Voigt (η = 0.5) peaks at PEAKS with the Caglioti widths on a sloped
+    background, with relative Gaussian noise.
+    Returns:
+      two_theta, intensity and the sample indices of the peaks.
+    """
+    two_theta = np.arange(15.0, 130.0, step)
+    u, v, w = TRUE_UVW
+    tan_theta = np.tan(np.deg2rad(PEAKS) / 2)
+    fwhm = np.sqrt(u * tan_theta**2 + v * tan_theta + w)
+    x = (two_theta[:, None] - PEAKS) / fwhm
+    shape = 0.5 / (1 + 4 * x**2) + 0.5 * np.exp(-4 * np.log(2) * x**2)
+    intensity = (1000 * shape).sum(axis=1) + 100 - 0.5 * two_theta
+    intensity *= 1 + rng.normal(0, noise, len(two_theta))
+    # Peak indices at the local maximum near every line, as a detector would give.
+    index = np.searchsorted(two_theta, PEAKS)[:, None] + np.arange(-3, 4)
+    return two_theta, intensity, index[np.arange(len(PEAKS)), intensity[index].argmax(axis=1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark instrument calibration and its cache.")
+    parser.add_argument('--noise', type=float, default=0.01, help="relative intensity noise")
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    two_theta, intensity, peaks = synthetic_standard(args.noise, rng)
+    config = {'instrument': 'synthetic', 'wavelength': 1.5406, 'profile': 'pseudo_voigt'}
+
+    def calibrate():
+        profiles = fit_peaks(two_theta, intensity, peaks)
+        return fit_caglioti(profiles.positions, profiles.fwhm, profiles.fwhm_errors, config)
+
+    model = calibrate()
+    errors = np.sqrt(np.diag(model.covariance))
+    print(f"{'':<3} {'true':>10} {'fitted':>10} {'error':>10}")
+    for name, true, fitted, error in zip('UVW', TRUE_UVW, (model.u, model.v, model.w), errors):
+        print(f"{name:<3} {true:>10.5f} {fitted:>10.5f} {error:>10.5f}")
+    tan_theta = np.tan(np.deg2rad(PEAKS) / 2)
+    true_fwhm = np.sqrt(np.polyval(TRUE_UVW, tan_theta))
+    print(f"max relative FWHM error over the standard's range: "
+          f"{np.max(np.abs(model.fwhm(PEAKS) / true_fwhm - 1)):.2%}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        save_instrument(model, directory)
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            calibrate()
+        refit = (time.perf_counter() - start) / args.repeats
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            cached = load_instrument(config, directory)
+        load = (time.perf_counter() - start) / args.repeats
+    assert cached == model
+    print(f"refit standard: {1e3 * refit:.3f} ms   cached load: {1e3 * load:.3f} ms   "
+          f"speed-up: {refit / load:.0f}x")
+
+if __name__ == "__main__":
+    main()
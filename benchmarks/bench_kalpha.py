@@ -0,0 +1,83 @@
+"""
+Kα2 stripping (src.kalpha.strip_kalpha2) on synthetic Cu Kα1/Kα2 doublets:
+residual Kα2 intensity, peak positions found by detect_peaks before and after
+stripping, and the stripping speed for one pattern and for a stack of patterns
+on the same grid. On the bundled Mo scans it checks that analyze_pattern finds
+the same reflections and structure with and without stripping.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_kalpha
+    python -m benchmarks.bench_kalpha --anode Mo --step 0.01 --patterns 2000
+"""
+
+import argparse
+import glob
+import os
+import time
+import numpy as np
+from src.analysis import analyze_pattern, detect_peaks
+from src.data_cleaner import clean_data
+from src.kalpha import KALPHA2_RATIO, KALPHA_LINES, kalpha2_angles, strip_kalpha2
+
+TRUE_PEAKS = np.array([28.44, 47.30, 56.12, 69.13, 76.38, 88.03, 94.95, 106.71, 114.09])
+
+def doublet_pattern(two_theta, lambda1, lambda2, fwhm, rng, noise):
+    """
+    Gaussian Kα1 lines at TRUE_PEAKS plus their Kα2 lines, on a flat background.
+    Returns:
+      the measured intensity and the Kα1-only intensity.
+    """
+    sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
+    lines = lambda centres: sum(1000 * np.exp(-0.5 * ((two_theta - c) / sigma)**2) for c in centres)
+    kalpha1 = 50 + lines(TRUE_PEAKS)
+    measured = kalpha1 + KALPHA2_RATIO * (50 + lines(kalpha2_angles(TRUE_PEAKS, lambda1, lambda2)))
+    return measured + rng.normal(0, noise, two_theta.size), kalpha1
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Kα2 stripping.")
+    parser.add_argument('--anode', choices=list(KALPHA_LINES), default='Cu')
+    parser.add_argument('--step', type=float, default=0.02)
+    parser.add_argument('--fwhm', type=float, default=0.08)
+    parser.add_argument('--noise', type=float, default=2.0)
+    parser.add_argument('--patterns', type=int, default=500)
+    parser.add_argument('--samples', default='samples', help="Directory with Sample*.txt Mo Kα raw files.")
+    args = parser.parse_args()
+
+    lambda1, lambda2 = KALPHA_LINES[args.anode]
+    two_theta = np.arange(20, 120, args.step)
+    rng = np.random.default_rng(0)
+    measured, kalpha1 = doublet_pattern(two_theta, lambda1, lambda2, args.fwhm, rng, args.noise)
+    stripped = strip_kalpha2(two_theta, measured, lambda1, lambda2)
+    residual = np.abs(stripped - kalpha1).max() / (kalpha1.max() - 50)
+    print(f"{args.anode} Kα, {len(two_theta)} points: largest residual {100 * residual:.2f}% of the peak height")
+
+    for label, intensity in (('measured', measured), ('stripped', stripped)):
+        angles, _ = detect_peaks(two_theta, intensity, prominence=100)
+        print(f"{label:<9} {len(angles):>3} peaks detected for {len(TRUE_PEAKS)} Kα1 lines")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        strip_kalpha2(two_theta, measured, lambda1, lambda2)
+    single = (time.perf_counter() - start) / 100
+    stack = np.tile(measured, (args.patterns, 1))
+    start = time.perf_counter()
+    strip_kalpha2(two_theta, stack, lambda1, lambda2)
+    stacked = (time.perf_counter() - start) / args.patterns
+    print(f"one pattern   {1e3 * single:.3f} ms")
+    print(f"stack of {args.patterns}  {1e3 * stacked:.3f} ms per pattern")
+
+    lambda1, lambda2 = KALPHA_LINES['Mo']
+    for raw_file in sorted(glob.glob(os.path.join(args.samples, "Sample*.txt"))):
+        two_theta, intensity = clean_data(raw_file, verbose=False, save=False)
+        plain = analyze_pattern(two_theta, intensity, lambda1)
+        stripped = analyze_pattern(two_theta, intensity, lambda1, kalpha2=(lambda1, lambda2, KALPHA2_RATIO))
+        same = (len(plain.peak_angles) == len(stripped.peak_angles)
+                and np.allclose(plain.peak_angles, stripped.peak_angles, atol=0.2)
+                and plain.best_structure == stripped.best_structure)
+        print(f"{os.path.basename(raw_file):<12} {len(plain.peak_angles)} -> {len(stripped.peak_angles)} peaks, "
+              f"{plain.best_structure.upper()} a = {plain.best.lattice_constant:.4f} -> "
+              f"{stripped.best_structure.upper()} a = {stripped.best.lattice_constant:.4f} Å"
+              + ("" if same else "  (reflections changed by stripping)"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Accuracy and speed of the sub-step peak refinement in src.peaks on synthetic
+Gaussian peaks placed between scan steps, compared with the sampled maxima.
+The reported uncertainty should match the scatter of the refined positions.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_peaks
+    python -m benchmarks.bench_peaks --step 0.08 --noise 20 --trials 500
+"""
+
+import argparse
+import time
+import numpy as np
+from scipy.signal import find_peaks
+from src.peaks import REFINE_METHODS, refine_peaks
+
+TRUE_PEAKS = np.array([15.013, 20.327, 28.889, 33.861, 41.04])
+
+def synthetic_pattern(step, noise, fwhm, rng):
+    two_theta = np.arange(10, 50, step)
+    sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
+    intensity = 100 + sum(1000 * np.exp(-0.5 * ((two_theta - t) / sigma)**2) for t in TRUE_PEAKS)
+    return two_theta, intensity + rng.normal(0, noise, two_theta.size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sub-step peak refinement.")
+    parser.add_argument('--step', type=float, default=0.05)
+    parser.add_argument('--fwhm', type=float, default=0.25)
+    parser.add_argument('--noise', type=float, default=10.0)
+    parser.add_argument('--trials', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    errors = {method: [] for method in ('sampled',) + REFINE_METHODS}
+    reported = {method: [] for method in REFINE_METHODS}
+    elapsed = dict.fromkeys(REFINE_METHODS, 0.0)
+    for _ in range(args.trials):
+        two_theta, intensity = synthetic_pattern(args.step, args.noise, args.fwhm, rng)
+        peaks, _ = find_peaks(intensity, prominence=20 * args.noise)
+        errors['sampled'].append(two_theta[peaks] - TRUE_PEAKS)
+        for method in REFINE_METHODS:
+            start = time.perf_counter()
+            refined = refine_peaks(two_theta, intensity, peaks, method)
+            elapsed[method] += time.perf_counter() - start
+            errors[method].append(refined.positions - TRUE_PEAKS)
+            reported[method].append(refined.position_errors)
+
+    print(f"{'method':<10} {'RMS error (°)':>14} {'scatter (°)':>12} {'reported σ (°)':>15} {'time/pattern (ms)':>18}")
+    for method, error in errors.items():
+        error = np.array(error)
+        sigma = f"{np.mean(reported[method]):>15.5f}" if method in reported else f"{'':>15}"
+        ms = f"{1e3 * elapsed[method] / args.trials:>18.3f}" if method in elapsed else f"{'':>18}"
+        print(f"{method:<10} {np.sqrt(np.mean(error**2)):>14.5f} {error.std(axis=0).mean():>12.5f} {sigma} {ms}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark of the batched structure fits in src.regression against one
+scipy.stats.linregress call per pattern and candidate structure.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_regression
+    python -m benchmarks.bench_regression --patterns 100 1000 10000
+"""
+
+import argparse
+import time
+import numpy as np
+from scipy.stats import linregress
+from src.analysis import get_allowed_reflections
+from src.regression import fit_structures
+
+def synthetic_peaks(n_patterns, seed=0):
+    """
+    Sorted sin²θ of 3-8 fcc-like peaks per pattern with a little noise.
+    """
+    rng = np.random.default_rng(seed)
+    Q = np.array([3, 4, 8, 11, 12, 16, 19, 20])
+    sin2_thetas = []
+    for _ in range(n_patterns):
+        n = rng.integers(3, len(Q) + 1)
+        slope = rng.uniform(0.005, 0.01)
+        sin2_thetas.append(np.sort(slope * Q[:n] + rng.normal(0, 1e-4, n)))
+    return sin2_thetas
+
+def loop_fits(sin2_thetas, reflection_sets):
+    r_squared = np.empty((len(sin2_thetas), len(reflection_sets)))
+    for i, sin2 in enumerate(sin2_thetas):
+        for j, reflections in enumerate(reflection_sets):
+            n = min(len(reflections), len(sin2))
+            r_squared[i, j] = linregress([q for q, _ in reflections[:n]], sin2[:n]).rvalue**2
+    return r_squared
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched structure regression.")
+    parser.add_argument('--patterns', type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    reflection_sets = [get_allowed_reflections(s) for s in ('fcc', 'bcc')]
+    print(f"{'patterns':>9} {'linregress loop (s)':>20} {'batched (s)':>12} {'speedup':>9} {'max |ΔR²|':>11}")
+    for n in args.patterns:
+        sin2_thetas = synthetic_peaks(n)
+        start = time.perf_counter()
+        ref = loop_fits(sin2_thetas, reflection_sets)
+        t_loop = time.perf_counter() - start
+        start = time.perf_counter()
+        new = fit_structures(sin2_thetas, reflection_sets, 0.7107)['r_squared']
+        t_batch = time.perf_counter() - start
+        print(f"{n:>9} {t_loop:>20.4f} {t_batch:>12.4f} {t_loop / t_batch:>8.1f}x {np.abs(ref - new).max():>11.2e}")
+
+if __name__ == "__main__":
+    main()
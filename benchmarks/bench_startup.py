@@ -0,0 +1,82 @@
+"""
+Cold-start time and peak memory of single-file runs of main.py.
+
+Every run is a fresh interpreter, so the numbers include Python start-up and
+all imports. Peak RSS is read from the child's resource usage. With
+--importtime, the slowest imports of the headless run are listed from
+python -X importtime (cumulative microseconds, including sub-imports).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --datafile samples/filtered_sample2.xy --repeats 10
+    python -m benchmarks.bench_startup --importtime
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODES = {
+    'help (--help)': ['--help'],
+    'headless (--no-plot)': ['--no-plot'],
+    'Agg figures (--plots)': ['--plots'],
+}
+
+def run_once(command):
+    """
+    Run a command and return its wall time in seconds and peak RSS in MB.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{process.stderr.read().decode()}")
+    process.stderr.close()
+    return elapsed, usage.ru_maxrss / 1024
+
+def import_breakdown(command, top=15):
+    """
+    Top-level imports of a command sorted by cumulative import time.
+    Returns:
+      a list of (cumulative seconds, module) tuples.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command[1:],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if not module.startswith('  '):  # top-level imports only (one leading space)
+            rows.append((int(cumulative) / 1e6, module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time and peak RSS of main.py.")
+    parser.add_argument('--datafile', default='samples/Sample1.txt')
+    parser.add_argument('--clean', action='store_true', help="Pass --clean to main.py.")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--importtime', action='store_true',
+                        help="Also list the slowest top-level imports of the headless run.")
+    args = parser.parse_args()
+
+    base = [sys.executable, 'main.py', args.datafile] + (['--clean'] if args.clean else [])
+    print(f"{'mode':<24} {'median (s)':>11} {'min (s)':>9} {'peak RSS (MB)':>14}")
+    for name, flags in MODES.items():
+        runs = [run_once(base + flags) for _ in range(args.repeats)]
+        times = [t for t, _ in runs]
+        rss = max(r for _, r in runs)
+        print(f"{name:<24} {statistics.median(times):>11.3f} {min(times):>9.3f} {rss:>14.1f}")
+
+    if args.importtime:
+        print("\nSlowest top-level imports of the headless run:")
+        for seconds, module in import_breakdown(base + MODES['headless (--no-plot)']):
+            print(f"  {seconds:>8.3f} s  {module}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of src.xy_reader.read_xy against the readers it replaced:
+np.loadtxt (previously in main.load_data) and pd.read_csv (previously in
+data_cleaner.clean_data).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_xy_reader
+    python -m benchmarks.bench_xy_reader --sizes 10000 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.xy_reader import read_xy
+
+def loadtxt_reader(filename):
+    data = np.loadtxt(filename, delimiter='\t')
+    return data[:, 0], data[:, 1]
+
+def read_csv_reader(filename):
+    df = pd.read_csv(filename, sep="\t", header=None)
+    return df[0].to_numpy(), df[1].to_numpy()
+
+READERS = {
+    'read_xy': read_xy,
+    'np.loadtxt': loadtxt_reader,
+    'pd.read_csv': read_csv_reader,
+}
+
+def write_scan(filename, n, seed=0):
+    """
+    Write a synthetic tab-separated scan with n points.
+    """
+    rng = np.random.default_rng(seed)
+    two_theta = np.linspace(0.05, 60, n)
+    intensity = rng.poisson(1000, n) * rng.random(n)
+    pd.DataFrame({0: two_theta, 1: intensity}).to_csv(filename, sep='\t', index=False, header=False)
+
+def best_of(func, filename, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(filename)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the two-column XY readers.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print("Times are best of three; 'differ' counts values not bit-identical to read_xy.")
+    print(f"{'points':>10}" + "".join(f"{name + ' (s)':>16}" for name in READERS)
+          + "".join(f"{name + ' differ':>20}" for name in READERS if name != 'read_xy'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            filename = os.path.join(tmp, f"scan_{n}.xy")
+            write_scan(filename, n)
+            results, times = {}, {}
+            for name, reader in READERS.items():
+                results[name], times[name] = best_of(reader, filename)
+            ref = np.concatenate(results['read_xy'])
+            differ = {name: int(np.count_nonzero(np.concatenate(r) != ref))
+                      for name, r in results.items() if name != 'read_xy'}
+            print(f"{n:>10}" + "".join(f"{times[name]:>16.4f}" for name in READERS)
+                  + "".join(f"{differ[name]:>20}" for name in differ))
+
+if __name__ == "__main__":
+    main()
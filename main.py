@@ -8,7 +8,7 @@ body-centered cubic (bcc) structure based on linear regression quality. It also
 routines to calculate the crystallite size of the sample using the powerxrd module.
 
 Features:
-  - Loads diffraction data (expected as two columns: 2θ in degrees and intensity, tab-separated).
+  - Loads diffraction data (expected as two columns: 2θ in degrees and intensity, tab-, whitespace- or comma-separated).
   - Optionally cleans raw data files using a rolling median filter to remove outliers.
   - Automatically selects the filtered data file corresponding to the provided raw file.
   - Performs peak detection and linear regression of sin²θ versus theoretical Q values.
@@ -26,191 +26,617 @@ Usage:
   To also run size calculations of the sample using the powerxrd module:
       python main.py samples/Sample1.txt --clean --size
 
+  To also search for tetragonal and hexagonal cells that index the detected peaks:
+      python main.py samples/filtered_sample1.xy --index tetragonal hexagonal
+
+  To calibrate the instrumental broadening once from a standard, then reuse it:
+      python main.py samples/Sample1.txt --clean --fit pseudo_voigt --standard lab6.xy --instrument mo-slit05
+      python main.py samples/Sample2.txt --clean --fit pseudo_voigt --instrument mo-slit05
+
+  To clean and analyze every sample in a directory and write a summary table:
+      python main.py samples --batch --clean --summary summary.json
+
 Arguments:
   datafile      Path to the input data file (raw or filtered).
-  --wavelength  X-ray wavelength in Å (default: 0.7107 for Mo Kα). 
+  --wavelength  X-ray wavelength in Å (default: 0.7107 for Mo Kα, or the anode's Kα1 wavelength
+                with --strip-kalpha2). 
   ** If you need another wavelength these need to be manually changed in powderxrd_patch.py in src **
+  --structures  Candidate cubic structures among sc, bcc, fcc and diamond (default: fcc bcc).
+  --assignment  Pair peaks with reflections in order (sequential, default) or with the optimal
+                assignment that tolerates extra peaks and missing reflections.
+  --detector    Peak detector: find_peaks (default) or cwt, a multi-scale wavelet detector that
+                needs no height/prominence tuning on noisy, low-count scans.
+  --refine      Refine the peak positions between scan steps: parabolic, centroid or gaussian
+                (default: positions snapped to the scan step).
+  --fit         Fit every detected peak with a gaussian or pseudo_voigt profile (all peaks in one
+                batched fit, overlapping peaks jointly) and list positions, FWHMs, areas and
+                Scherrer crystallite sizes (K = src.size.SCHERRER_K, --wavelength). With --batch
+                the summary gets the mean size of every pattern, without powerxrd charts or
+                plots. Williamson–Hall size and microstrain (linear and quadratic/modified
+                plots) with 95% intervals are listed as well.
+  --instrumental-fwhm  Instrumental FWHM (degrees 2θ) removed in quadrature before the sizes.
+  --standard    Scan of a line-broadening standard (e.g. LaB6 or Si). Its fitted peak widths give
+                the Caglioti U/V/W model of the instrument, which is cached under .instruments/
+                for the configuration (--instrument, --wavelength, --fit, --detector, --background
+                and Kα2 stripping) and removed in quadrature from the fitted widths at every
+                peak's angle.
+  --instrument  Name of the instrument configuration (default: default). Later runs with the same
+                configuration load the cached model without --standard.
+  --refit-instrument  Refit the --standard even if its instrument model is cached.
+  --background  Subtract the background before peak detection: snip, rolling_ball or polynomial
+                (src/background.py). The size routines reuse it (default for them: snip) in place
+                of powerxrd's Chart.backsub, so their widths differ from Chart.backsub-based runs.
+  --strip-kalpha2  Strip the Kα2 doublet lines before peak detection (Rachinger method) using
+                the Kα1/Kα2 wavelengths of an anode (Mo, Cu, Co, Fe, Cr or Ag; default: Mo).
+                The peaks are then Kα1 lines, so the Kα1 wavelength is used unless --wavelength is given.
+  --kalpha-lines  Custom Kα1 and Kα2 wavelengths in Å for the stripping.
+  --kalpha2-ratio  Kα2/Kα1 intensity ratio used for the stripping (default: 0.5).
+  --index       Auto-index the detected peaks in the given crystal systems (cubic, tetragonal,
+                hexagonal, orthorhombic) and list the best cells by figure of merit.
   --clean       Flag to clean raw data files and use the filtered versions for analysis.
+  --filter      Outlier filter used when cleaning: hampel (default), savgol or morphological.
+  --workers     Number of processes used to clean raw files, to search cells with --index or,
+                with --batch, to analyze patterns (default: 1, 0 for one per CPU core).
+  --force       Re-clean every raw file even if its filtered file is up to date.
+  --chunk-size  Stream raw files in chunks of this many lines while cleaning (for very long scans).
+  --no-save     Analyze the cleaned data in memory without writing its filtered file.
+  --batch       Analyze every pattern in a directory (its .xy files) or glob in a process pool
+                and write one summary table (no plots).
+  --summary     Summary table written by --batch, .csv or .json (default: batch_summary.csv).
+  --no-plot     Headless mode: print the results only, without importing matplotlib.
+  --plots       Save the figures using the non-interactive Agg backend instead of showing them.
   --size        Flag to run additional routines for size calculations using the powerxrd module.
 """
 
 import argparse
+import csv
+import glob
+import json
 import re
+import warnings
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.signal import find_peaks
-from scipy.stats import linregress
 import os
-import src.powderxrd_patch as powderxrd_patch
-from src.data_cleaner import clean_all_raw_data
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from src.pattern_cache import load_pattern
+from src.data_cleaner import clean_all_raw_data, clean_data, filtered_path, record_cleaned
+from src.filters import FILTERS
+from src.background import BACKGROUNDS
+from src.analysis import analyze_pattern, detect_peaks, get_allowed_reflections, perform_regression
+from src.indexing import SYSTEMS, index_pattern
+from src.instrument import CagliotiModel, fit_caglioti, load_instrument, save_instrument
+from src.kalpha import KALPHA2_RATIO, KALPHA_LINES
+from src.peaks import DETECTORS, REFINE_METHODS
+from src.profiles import PROFILES
+from src.size import SCHERRER_K, WH_MODELS, scherrer_sizes, williamson_hall
+from src.reflections import LATTICES
+
+# SciPy, matplotlib and powerxrd are imported inside the functions that use them,
+# so --help, batch workers and headless runs only pay for what they need.
 
 def load_data(filename):
     """
     Load diffraction data from a file.
-    Expected file format: two columns (2θ in degrees, intensity) separated by tabs.
+    Expected file format: two columns (2θ in degrees, intensity) separated by tabs,
+    whitespace or commas. Parsed data is cached in a binary sidecar next to the file.
     """
-    data = np.loadtxt(filename, delimiter='\t')
-    two_theta = data[:, 0]
-    intensity = data[:, 1]
-    return two_theta, intensity
+    return load_pattern(filename)
 
-def detect_peaks(two_theta, intensity, height_frac=0.001, prominence=1):
+def instrumental_widths(two_theta, instrumental_fwhm):
+    """
+    Instrumental FWHM at the peaks two_theta: instrumental_fwhm itself if it is a
+    constant width (or None), or evaluated there if it is a CagliotiModel.
     """
-    Detect peaks in the diffraction pattern.
+    if isinstance(instrumental_fwhm, CagliotiModel):
+        return instrumental_fwhm.fwhm(two_theta)
+    return instrumental_fwhm
+
+def calibrate_instrument(config, standard=None, refit=False):
+    """
+    Caglioti model of an instrument configuration, a dict of the instrument name
+    and the analysis settings that change the fitted widths (wavelength,
+    profile, detector, background and kalpha2, as passed to analyze_pattern).
+    The cached model is loaded unless refit is set; otherwise the peaks of the
+    standard's scan are fitted with those settings and the model of their
+    widths is cached for later runs.
     Returns:
-      peak_angles: detected 2θ positions,
-      peak_intensities: intensities at those positions.
-    """
-    height_threshold = np.max(intensity) * height_frac
-    peaks, _ = find_peaks(intensity, height=height_threshold, prominence=prominence)
-    return two_theta[peaks], intensity[peaks]
-
-def get_allowed_reflections(structure):
-    """
-    Return allowed reflections for cubic crystals as a list of tuples (Q, Miller label).
-    For fcc:
-      (111): Q=3, (200): Q=4, (220): Q=8, (311): Q=11, (222): Q=12, ...
-    For bcc:
-      (110): Q=2, (200): Q=4, (211): Q=6, (220): Q=8, (310): Q=10, ...
-    """
-    structure = structure.lower()
-    if structure == 'fcc':
-        reflections = [(3, '(111)'), (4, '(200)'), (8, '(220)'), (11, '(311)'), (12, '(222)')]
-    elif structure == 'bcc':
-        reflections = [(2, '(110)'), (4, '(200)'), (6, '(211)'), (8, '(220)'), (10, '(310)')]
-    else:
-        raise ValueError("Structure type must be 'fcc' or 'bcc'.")
-    return reflections
+      the CagliotiModel, or None if nothing is cached and no standard is given.
+    """
+    model = None if refit else load_instrument(config)
+    if model is not None or not standard:
+        return model
+    two_theta, intensity = load_data(standard)
+    analysis = analyze_pattern(two_theta, intensity, config['wavelength'], LATTICES,
+                               detector=config['detector'], kalpha2=config['kalpha2'],
+                               background=config['background'], profile=config['profile'])
+    profiles = analysis.profiles
+    converged = profiles.converged
+    model = fit_caglioti(profiles.positions[converged], profiles.fwhm[converged],
+                         profiles.fwhm_errors[converged], config)
+    print(f"Saved instrument model of {standard} to {save_instrument(model)}")
+    return model
+
+def mean_crystallite_size(profiles, wavelength, instrumental_fwhm=None):
+    """
+    Mean Scherrer size in nm (wavelength in Å) over the fitted peaks that are
+    broader than the instrument, or None if there are none. instrumental_fwhm is
+    a constant width or a CagliotiModel.
+    """
+    sizes = scherrer_sizes(profiles.positions, profiles.fwhm, wavelength,
+                           instrumental_fwhm=instrumental_widths(profiles.positions, instrumental_fwhm)).sizes
+    sizes = sizes[np.isfinite(sizes)]
+    return float(sizes.mean() / 10) if len(sizes) else None
+
+def summarize_file(filename, wavelength, structures=('fcc', 'bcc'), assignment='sequential',
+                   refine=None, detector='find_peaks', kalpha2=None, background=None,
+                   profile=None, instrumental_fwhm=None):
+    """
+    Analyze one data file for batch mode. Errors are recorded in the row instead
+    of raised so that one bad file does not abort the batch.
+    instrumental_fwhm is a constant width (degrees 2θ) or a CagliotiModel.
+    Returns:
+      a summary row (dict) with the best structure, lattice constant, R² and peak
+      count, and with profile also the mean Scherrer crystallite size and the
+      Williamson–Hall size and strain.
+    """
+    row = {'file': filename, 'structure': None, 'lattice_constant': None,
+           'r_squared': None, 'n_peaks': None, 'error': None}
+    if profile:
+        row.update(crystallite_size_nm=None, wh_size_nm=None, wh_strain=None)
+    try:
+        two_theta, intensity = load_data(filename)
+        analysis = analyze_pattern(two_theta, intensity, wavelength, structures,
+                                   assignment=assignment, refine=refine,
+                                   detector=detector, kalpha2=kalpha2,
+                                   background=background, profile=profile)
+        row.update(analysis.summary())
+        if profile:
+            profiles = analysis.profiles
+            row['crystallite_size_nm'] = mean_crystallite_size(profiles, wavelength, instrumental_fwhm)
+            wh = williamson_hall(profiles.positions, profiles.fwhm, wavelength,
+                                 instrumental_fwhm=instrumental_widths(profiles.positions, instrumental_fwhm))
+            if np.isfinite(wh.sizes):
+                row.update(wh_size_nm=float(wh.sizes / 10), wh_strain=float(wh.strains))
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+    return row
+
+def find_batch_files(pattern):
+    """
+    Files analyzed in batch mode: every .xy file in a directory, or the files
+    matching a glob pattern.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.xy")
+    return sorted(glob.glob(pattern))
 
-def perform_regression(sin2_theta, reflections, wavelength):
+def run_batch(pattern, wavelength, workers=None, summary_file="batch_summary.csv",
+              structures=('fcc', 'bcc'), assignment='sequential', refine=None,
+              detector='find_peaks', kalpha2=None, background=None, profile=None,
+              instrumental_fwhm=None):
     """
-    Performs a linear regression of sin²θ versus theoretical Q values.
+    Analyze every pattern matched by find_batch_files in a process pool and write
+    one summary table. The format follows summary_file's extension (.csv or .json).
     Returns:
-      slope, intercept, r_squared, and the calculated lattice constant.
-    """
-    n_reflections = min(len(reflections), len(sin2_theta))
-    Q_theoretical = np.array([reflections[i][0] for i in range(n_reflections)])
-    sin2_theta_used = sin2_theta[:n_reflections]
-    regression = linregress(Q_theoretical, sin2_theta_used)
-    slope = regression.slope
-    intercept = regression.intercept
-    r_squared = regression.rvalue**2
-    # Calculate lattice constant using a = λ/(2*sqrt(slope))
-    a = wavelength / (2 * np.sqrt(slope))
-    return slope, intercept, r_squared, a, Q_theoretical, sin2_theta_used
+      the list of summary rows, in file order.
+    """
+    files = find_batch_files(pattern)
+    n_files = len(files)
+    summarize = partial(summarize_file, wavelength=wavelength, structures=structures,
+                        assignment=assignment, refine=refine, detector=detector, kalpha2=kalpha2,
+                        background=background, profile=profile, instrumental_fwhm=instrumental_fwhm)
+    if workers == 1 or n_files <= 1:
+        rows = list(map(summarize, files))
+    else:
+        n_workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            rows = list(executor.map(summarize, files, chunksize=max(1, n_files // (4 * n_workers))))
+
+    print(f"{'file':<40} {'structure':>9} {'a (Å)':>9} {'R²':>9} {'peaks':>6}")
+    for row in rows:
+        if row['error'] is None:
+            print(f"{row['file']:<40} {row['structure'].upper():>9} {row['lattice_constant']:>9.5f} "
+                  f"{row['r_squared']:>9.5f} {row['n_peaks']:>6}")
+        else:
+            print(f"{row['file']:<40} failed: {row['error']}")
+
+    if summary_file.lower().endswith('.json'):
+        with open(summary_file, 'w') as f:
+            json.dump(rows, f, indent=1)
+    else:
+        with open(summary_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['file'])
+            writer.writeheader()
+            writer.writerows(rows)
+    print(f"Saved summary of {n_files} file(s) to {summary_file}")
+    return rows
+
+def get_pyplot(show=True):
+    """
+    Import matplotlib.pyplot on first use. With show=False the non-interactive
+    Agg backend is selected so figures can be rendered without a display.
+    """
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+        # The powerxrd routines call plt.show(), which only warns under Agg.
+        warnings.filterwarnings('ignore', message='.*non-interactive.*')
+    import matplotlib.pyplot as plt
+    return plt
+
+def plot_results(two_theta, intensity, analysis, sample_num, show=True):
+    """
+    Plot the linear fit of the best structure and the indexed diffraction pattern,
+    save them to figs/ and show them unless show is False.
+    """
+    plt = get_pyplot(show)
+    best_structure = analysis.best_structure
+    best_result = analysis.best
+    peak_angles = analysis.peak_angles[best_result.peak_indices]
+    # Plot the linear fit for the best structure.
+    plt.figure()
+    plt.plot(best_result.Q_theoretical, best_result.sin2_used, 'o', label='Data')
+    Q_fit = np.linspace(min(best_result.Q_theoretical), max(best_result.Q_theoretical), 100)
+    sin2_fit = best_result.slope * Q_fit + best_result.intercept
+    plt.plot(Q_fit, sin2_fit, '-', label=f'Linear fit (r² = {best_result.r_squared:.5f})')
+    plt.xlabel('Q=(h²+k²+l²)')
+    plt.ylabel('sin²θ')
+    plt.title(f'Linear Regression for Sample {sample_num}, {best_structure.upper()} Structure')
+    plt.grid()
+    plt.legend()
+    plt.savefig(f"figs/lin_reg_sample{sample_num}.pdf")
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
+    # Plot the diffraction pattern with annotated peaks.
+    plt.figure()
+    plt.plot(two_theta, intensity, label=f'Sample {sample_num} data')
+    n_annotate = len(best_result.miller_labels)
+    for angle, label in zip(peak_angles[:n_annotate], best_result.miller_labels):
+        intensity_at_peak = np.interp(angle, two_theta, intensity)
+        plt.annotate(label, xy=(angle, intensity_at_peak), xytext=(0, 10),
+                     textcoords='offset points', ha='center', fontsize=10, color='red')
+    plt.xlabel('2 $\\theta$ (deg)')
+    plt.ylabel('Intensity (a.u.)')
+    bottom, _ = plt.ylim()
+    plt.ylim(bottom, 1.1 * max(intensity))
+    plt.title(f'Diffraction Pattern with Indexed Peaks for Sample {sample_num}')
+    plt.grid()
+    plt.legend()
+    plt.savefig(f"figs/diff_pattern_sample{sample_num}.pdf")
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
 
 def main():
-    os.makedirs("figs", exist_ok=True)
     parser = argparse.ArgumentParser(
         description="Determine lattice constant and crystal structure from XRD data."
     )
     parser.add_argument(
         'datafile',
-        help="Raw data file (e.g., samples/Sample1.txt)"
+        help="Raw data file (e.g., samples/Sample1.txt), or a directory/glob with --batch"
     )
     parser.add_argument(
         '--wavelength',
         type=float,
-        default=0.7107,
-        help="X-ray wavelength in Å (default: 0.7107 for Mo Kα)"
+        default=None,
+        help="X-ray wavelength in Å (default: 0.7107 for Mo Kα, or the Kα1 wavelength with --strip-kalpha2)"
+    )
+    parser.add_argument(
+        '--structures',
+        nargs='+',
+        choices=LATTICES,
+        default=['fcc', 'bcc'],
+        help="Candidate cubic structures (default: fcc bcc)."
+    )
+    parser.add_argument(
+        '--assignment',
+        choices=['sequential', 'optimal'],
+        default='sequential',
+        help="Peak-to-reflection pairing: first-n (sequential, default) or optimal, "
+             "which tolerates extra peaks and missing reflections."
+    )
+    parser.add_argument(
+        '--detector',
+        choices=DETECTORS,
+        default='find_peaks',
+        help="Peak detector: find_peaks (default) or cwt, a multi-scale detector for noisy scans."
+    )
+    parser.add_argument(
+        '--refine',
+        choices=REFINE_METHODS,
+        default=None,
+        help="Refine peak positions between scan steps (parabolic, centroid or gaussian)."
+    )
+    parser.add_argument(
+        '--fit',
+        choices=PROFILES,
+        default=None,
+        help="Fit every detected peak with this profile and list positions, FWHMs, areas, "
+             "Scherrer sizes and Williamson–Hall size/strain (with --batch: per-pattern summaries)."
+    )
+    parser.add_argument(
+        '--instrumental-fwhm',
+        type=float,
+        default=None,
+        help="Instrumental FWHM in degrees 2θ removed from the fitted widths before the Scherrer sizes."
+    )
+    parser.add_argument(
+        '--standard',
+        default=None,
+        help="Scan of a line-broadening standard: fit and cache the Caglioti model of the instrument "
+             "and remove it from the fitted widths (needs --fit)."
+    )
+    parser.add_argument(
+        '--instrument',
+        default=None,
+        help="Instrument configuration name under which the Caglioti model is cached and loaded "
+             "(default: default)."
+    )
+    parser.add_argument(
+        '--refit-instrument',
+        action='store_true',
+        help="Refit the --standard even if its instrument model is cached."
+    )
+    parser.add_argument(
+        '--background',
+        choices=BACKGROUNDS,
+        default=None,
+        help="Subtract the background before peak detection: snip, rolling_ball or polynomial. "
+             "--size uses it (default: snip) instead of powerxrd's Chart.backsub."
+    )
+    parser.add_argument(
+        '--strip-kalpha2',
+        nargs='?',
+        const='Mo',
+        choices=list(KALPHA_LINES),
+        metavar='ANODE',
+        help=f"Strip the Kα2 doublet lines before peak detection, using the Kα1/Kα2 wavelengths "
+             f"of this anode ({', '.join(KALPHA_LINES)}; default: Mo)."
+    )
+    parser.add_argument(
+        '--kalpha-lines',
+        nargs=2,
+        type=float,
+        metavar=('LAMBDA1', 'LAMBDA2'),
+        help="Kα1 and Kα2 wavelengths in Å for --strip-kalpha2, overriding the anode's."
+    )
+    parser.add_argument(
+        '--kalpha2-ratio',
+        type=float,
+        default=KALPHA2_RATIO,
+        help=f"Kα2/Kα1 intensity ratio for --strip-kalpha2 (default: {KALPHA2_RATIO})."
+    )
+    parser.add_argument(
+        '--index',
+        nargs='+',
+        choices=list(SYSTEMS),
+        metavar='SYSTEM',
+        help=f"Auto-index the detected peaks in these crystal systems ({', '.join(SYSTEMS)})."
     )
     parser.add_argument(
         '--clean',
         action='store_true',
         help="Clean raw data files and use filtered data for analysis."
     )
+    parser.add_argument(
+        '--filter',
+        choices=list(FILTERS),
+        default='hampel',
+        help="Outlier filter used by --clean (default: hampel)."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Number of processes used by --clean, --batch and --index (default: 1, 0 for one per CPU core)."
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help="With --clean, re-clean every raw file even if its filtered file is up to date."
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=None,
+        help="With --clean, stream raw files in chunks of this many lines to bound memory use."
+    )
+    parser.add_argument(
+        '--no-save',
+        action='store_true',
+        help="With --clean, analyze the cleaned data in memory without writing its filtered file."
+    )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help="Analyze every pattern in a directory (its .xy files) or glob and write a summary table."
+    )
+    parser.add_argument(
+        '--summary',
+        default='batch_summary.csv',
+        help="Summary table written by --batch, .csv or .json (default: batch_summary.csv)."
+    )
+    plot_group = parser.add_mutually_exclusive_group()
+    plot_group.add_argument(
+        '--no-plot',
+        dest='plot_mode',
+        action='store_const',
+        const='none',
+        default='show',
+        help="Headless mode: print results only; matplotlib is never imported."
+    )
+    plot_group.add_argument(
+        '--plots',
+        dest='plot_mode',
+        action='store_const',
+        const='save',
+        help="Render and save figures with the non-interactive Agg backend without showing them."
+    )
     parser.add_argument(
         '--size',
         action='store_true',
         help="Run size calculation functions after analysis."
     )
     args = parser.parse_args()
+    if args.size and args.plot_mode == 'none':
+        parser.error("--size draws its figures with powerxrd; use --plots for unattended runs.")
+    if args.chunk_size and args.filter != 'hampel':
+        parser.error("--chunk-size only supports the hampel filter.")
+    if args.kalpha_lines and not args.strip_kalpha2:
+        args.strip_kalpha2 = 'Mo'
+    kalpha2 = None
+    if args.strip_kalpha2:
+        if not 0 <= args.kalpha2_ratio < 1:
+            parser.error("--kalpha2-ratio must be in [0, 1).")
+        kalpha2 = (*(args.kalpha_lines or KALPHA_LINES[args.strip_kalpha2]), args.kalpha2_ratio)
+    if args.wavelength is None:
+        # Stripped peaks are Kα1 lines.
+        args.wavelength = kalpha2[0] if kalpha2 else 0.7107
+    instrumental_fwhm = args.instrumental_fwhm
+    if args.refit_instrument and not args.standard:
+        parser.error("--refit-instrument needs the --standard to refit.")
+    if args.standard or args.instrument:
+        if not args.fit:
+            parser.error("--standard and --instrument correct the fitted widths; use them with --fit.")
+        if args.instrumental_fwhm is not None:
+            parser.error("--instrumental-fwhm cannot be combined with --standard or --instrument.")
+        config = {'instrument': args.instrument or 'default', 'wavelength': args.wavelength,
+                  'profile': args.fit, 'detector': args.detector, 'background': args.background,
+                  'kalpha2': kalpha2}
+        try:
+            instrumental_fwhm = calibrate_instrument(config, args.standard, args.refit_instrument)
+        except ValueError as error:
+            parser.error(f"Cannot calibrate the instrument from {args.standard}: {error}")
+        if instrumental_fwhm is None:
+            parser.error(f"No instrument model is cached for '{config['instrument']}' with these settings; "
+                         f"calibrate it with --standard.")
+        print(f"Instrument '{config['instrument']}' (Caglioti, {instrumental_fwhm.n_peaks} peaks): "
+              f"U = {instrumental_fwhm.u:.3e}, V = {instrumental_fwhm.v:.3e}, W = {instrumental_fwhm.w:.3e} deg²")
+
+    if args.batch:
+        if args.clean:
+            directory = args.datafile if os.path.isdir(args.datafile) else os.path.dirname(args.datafile)
+            clean_all_raw_data(os.path.join(directory, "Sample*.txt"), workers=args.workers or None,
+                               params={'filter': args.filter}, force=args.force,
+                               chunk_size=args.chunk_size)
+        run_batch(args.datafile, args.wavelength, workers=args.workers or None,
+                  summary_file=args.summary, structures=args.structures,
+                  assignment=args.assignment, refine=args.refine, detector=args.detector,
+                  kalpha2=kalpha2, background=args.background, profile=args.fit,
+                  instrumental_fwhm=instrumental_fwhm)
+        return
+
+    if args.plot_mode != 'none':
+        os.makedirs("figs", exist_ok=True)
+    if args.size:
+        get_pyplot(args.plot_mode == 'show')
 
     # If --clean flag is provided, clean all raw files in the directory.
+    two_theta = intensity = None
     if args.clean:
-        clean_all_raw_data(args.datafile)
-        # Update the datafile to use the corresponding filtered file.
+        params = {'filter': args.filter}
         base = os.path.basename(args.datafile)
-        match = re.search(r'Sample(\d+)', base, re.IGNORECASE)
-        if match:
-            sample_num = match.group(1)
-            filtered_file = os.path.join(os.path.dirname(args.datafile), f"filtered_sample{sample_num}.xy")
+        if args.chunk_size and re.search(r'Sample(\d+)', base, re.IGNORECASE):
+            # Streaming keeps memory bounded, so the filtered file is read back afterwards.
+            clean_all_raw_data(args.datafile, workers=args.workers or None, params=params,
+                               force=args.force, chunk_size=args.chunk_size)
+            args.datafile = filtered_path(args.datafile)
+            print(f"Using filtered data file: {args.datafile}")
+        elif re.search(r'Sample(\d+)', base, re.IGNORECASE):
+            # The requested file is cleaned in memory and analyzed directly; the
+            # other raw files in the directory are cleaned to disk as before.
+            clean_all_raw_data(args.datafile, workers=args.workers or None, params=params,
+                               force=args.force, exclude=[args.datafile])
+            save = args.size or not args.no_save  # the size routines read the filtered file
+            two_theta, intensity = clean_data(args.datafile, params=params, save=save)
+            filtered_file = filtered_path(args.datafile)
+            if save:
+                record_cleaned(args.datafile, filtered_file, params)
+            # Update the datafile to use the corresponding filtered file.
             args.datafile = filtered_file
             print(f"Using filtered data file: {args.datafile}")
         else:
+            clean_all_raw_data(args.datafile, workers=args.workers or None, params=params,
+                               force=args.force, chunk_size=args.chunk_size)
             print("Warning: Could not determine sample number from filename; using raw file.")
 
+    match = re.search(r'sample(\d+)', os.path.basename(args.datafile), re.IGNORECASE)
+    sample_num = match.group(1) if match else os.path.splitext(os.path.basename(args.datafile))[0]
+
     # Proceed with analysis using args.datafile.
-    two_theta, intensity = load_data(args.datafile)
-    peak_angles, _ = detect_peaks(two_theta, intensity)
-    peak_angles = np.sort(peak_angles)
-    theta_deg = peak_angles / 2.0
-    theta_rad = np.deg2rad(theta_deg)
-    sin2_theta = np.sin(theta_rad)**2
-
-    structures = ['fcc', 'bcc']
-    results = {}
-    for structure in structures:
-        reflections = get_allowed_reflections(structure)
-        slope, intercept, r_squared, a, Q_theoretical, sin2_used = perform_regression(
-            sin2_theta, reflections, args.wavelength
-        )
-        results[structure] = {
-            'slope': slope,
-            'intercept': intercept,
-            'r_squared': r_squared,
-            'lattice_constant': a,
-            'Q_theoretical': Q_theoretical,
-            'sin2_used': sin2_used,
-            'miller_labels': [r[1] for r in reflections[:len(Q_theoretical)]]
-        }
+    if two_theta is None:
+        two_theta, intensity = load_data(args.datafile)
+    analysis = analyze_pattern(two_theta, intensity, args.wavelength, args.structures,
+                               assignment=args.assignment, refine=args.refine, detector=args.detector,
+                               kalpha2=kalpha2, background=args.background, profile=args.fit)
+    if args.refine:
+        print(f"Refined peaks ({args.refine}):")
+        for angle, angle_error, height, height_error in zip(
+                analysis.peak_angles, analysis.peak_angle_errors,
+                analysis.peak_intensities, analysis.peak_intensity_errors):
+            print(f"  2θ = {angle:.4f} ± {angle_error:.4f}°  I = {height:.1f} ± {height_error:.1f}")
+        print()
+    if args.fit:
+        profiles = analysis.profiles
+        instrumental = instrumental_widths(profiles.positions, instrumental_fwhm)
+        sizes = scherrer_sizes(profiles.positions, profiles.fwhm, args.wavelength,
+                               fwhm_errors=profiles.fwhm_errors, position_errors=profiles.position_errors,
+                               instrumental_fwhm=instrumental)
+        print(f"Fitted peak profiles ({args.fit}), Scherrer sizes with K = {SCHERRER_K}:")
+        for i in range(len(profiles.positions)):
+            print(f"  2θ = {profiles.positions[i]:.4f} ± {profiles.position_errors[i]:.4f}°  "
+                  f"FWHM = {profiles.fwhm[i]:.4f} ± {profiles.fwhm_errors[i]:.4f}°  "
+                  f"area = {profiles.areas[i]:.2f} ± {profiles.area_errors[i]:.2f}  "
+                  f"D = {sizes.sizes[i] / 10:.1f} ± {sizes.size_errors[i] / 10:.1f} nm"
+                  + ("" if profiles.converged[i] else "  (not converged)"))
+        for model in WH_MODELS:
+            wh = williamson_hall(profiles.positions, profiles.fwhm, args.wavelength, model=model,
+                                 instrumental_fwhm=instrumental)
+            (size_low, size_high), (strain_low, strain_high) = wh.size_intervals, wh.strain_intervals
+            print(f"  Williamson–Hall ({model}, {wh.n_peaks} peaks, R² = {wh.r_squared:.4f}): "
+                  f"D = {wh.sizes / 10:.1f} nm [{size_low / 10:.1f}, {size_high / 10:.1f}], "
+                  f"ε = {wh.strains:.2e} [{strain_low:.2e}, {strain_high:.2e}] (95% CI)")
+        print()
+    for structure, fit in analysis.fits.items():
         print(f"Structure: {structure.upper()}")
-        print(f"  Slope       = {slope:.5e}")
-        print(f"  Intercept   = {intercept:.5e}")
-        print(f"  R-squared   = {r_squared:.5f}")
-        print(f"  Lattice constant a = {a:.5f} Å\n")
+        print(f"  Slope       = {fit.slope:.5e}")
+        print(f"  Intercept   = {fit.intercept:.5e}")
+        print(f"  R-squared   = {fit.r_squared:.5f}")
+        print(f"  Lattice constant a = {fit.lattice_constant:.5f} Å\n")
 
-    best_structure = max(results, key=lambda s: results[s]['r_squared'])
-    best_result = results[best_structure]
-    print(f"Automatically determined structure: {best_structure.upper()}")
-    print(f"Calculated lattice constant a = {best_result['lattice_constant']:.5f} Å")
+    print(f"Automatically determined structure: {analysis.best_structure.upper()}")
+    print(f"Calculated lattice constant a = {analysis.best.lattice_constant:.5f} Å")
 
-    # Plot the linear fit for the best structure.
-    plt.figure()
-    plt.plot(best_result['Q_theoretical'], best_result['sin2_used'], 'o', label='Data')
-    Q_fit = np.linspace(min(best_result['Q_theoretical']), max(best_result['Q_theoretical']), 100)
-    sin2_fit = best_result['slope'] * Q_fit + best_result['intercept']
-    plt.plot(Q_fit, sin2_fit, '-', label=f'Linear fit (r² = {best_result["r_squared"]:.5f})')
-    plt.xlabel('Q=(h²+k²+l²)')
-    plt.ylabel('sin²θ')
-    plt.title(f'Linear Regression for Sample {sample_num}, {best_structure.upper()} Structure')
-    plt.grid()
-    plt.legend()
-    plt.savefig(f"figs/lin_reg_sample{sample_num}.pdf")
-    plt.show()
+    for system in args.index or ():
+        print(f"\nAuto-indexing ({system}):")
+        try:
+            solutions = index_pattern(analysis.peak_angles, args.wavelength, systems=(system,),
+                                      n_solutions=5, workers=args.workers or os.cpu_count() or 1)
+        except ValueError as error:
+            print(f"  {error}")
+            continue
+        if not solutions:
+            print("  No cell indexes every peak.")
+        for solution in solutions:
+            cell = ', '.join(f"{name}={length:.5f}" for name, length in zip(SYSTEMS[system], solution.cell))
+            print(f"  {cell} Å  V={solution.volume:.2f} Å³  M{len(solution.hkl)}={solution.figure_of_merit:.1f}"
+                  f"  zero={solution.zero_shift:+.3f}°")
 
-    # Plot the diffraction pattern with annotated peaks.
-    plt.figure()
-    plt.plot(two_theta, intensity, label=f'Sample {sample_num} data')
-    n_annotate = len(best_result['miller_labels'])
-    for angle, label in zip(peak_angles[:n_annotate], best_result['miller_labels']):
-        intensity_at_peak = np.interp(angle, two_theta, intensity)
-        plt.annotate(label, xy=(angle, intensity_at_peak), xytext=(0, 10),
-                     textcoords='offset points', ha='center', fontsize=10, color='red')
-    plt.xlabel('2 $\\theta$ (deg)')
-    plt.ylabel('Intensity (a.u.)')
-    bottom, _ = plt.ylim()
-    plt.ylim(bottom, 1.1 * max(intensity))
-    plt.title(f'Diffraction Pattern with Indexed Peaks for Sample {sample_num}')
-    plt.grid()
-    plt.legend()
-    plt.savefig(f"figs/diff_pattern_sample{sample_num}.pdf")
-    plt.show()
+    if args.plot_mode != 'none':
+        plot_results(two_theta, intensity, analysis, sample_num,
+                     show=args.plot_mode == 'show')
 
     # Run size calculations if --size flag is provided.
     if args.size:
-        powderxrd_patch.backsub_multiplt() # This function does not actually provide any calculations, it's just nice to have/see
-        powderxrd_patch.all_peaks(args.datafile)
+        import src.powderxrd_patch as powderxrd_patch
+        method = args.background or 'snip'
+        powderxrd_patch.backsub_multiplt(method) # This function does not actually provide any calculations, it's just nice to have/see
+        powderxrd_patch.all_peaks(args.datafile, analysis.background, method)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,240 @@
+"""
+Lattice-constant analysis of a single powder XRD pattern.
+
+analyze_pattern is the library entry point: it takes 2θ/intensity arrays and
+returns a PatternAnalysis, so patterns can be analyzed in-process without
+going through main.py.
+"""
+
+from dataclasses import dataclass, field
+import numpy as np
+from src.assignment import assign_peaks
+from src.background import estimate_background
+from src.kalpha import strip_kalpha2
+from src.peaks import cwt_peaks, find_peaks_stack, refine_peaks
+from src.profiles import fit_peaks
+from src.reflections import first_reflections
+from src.regression import fit_lines, fit_structures
+
+def _find_peak_indices(two_theta, intensity, height_frac=0.001, prominence=1, detector='find_peaks'):
+    """
+    Sample indices of the peaks of a pattern. detector='cwt' uses
+    src.peaks.cwt_peaks, which ignores height_frac and prominence.
+    """
+    if detector == 'cwt':
+        return cwt_peaks(two_theta, intensity)
+    if detector != 'find_peaks':
+        raise ValueError("detector must be 'find_peaks' or 'cwt'.")
+    from scipy.signal import find_peaks
+    height_threshold = np.max(intensity) * height_frac
+    peaks, _ = find_peaks(intensity, height=height_threshold, prominence=prominence)
+    return peaks
+
+def detect_peaks(two_theta, intensity, height_frac=0.001, prominence=1, refine=None,
+                 detector='find_peaks'):
+    """
+    Detect peaks in the diffraction pattern.
+    detector is 'find_peaks' (thresholds height_frac and prominence) or 'cwt'
+    (multi-scale wavelet detector without thresholds to tune, see src.peaks).
+    refine (one of src.peaks.REFINE_METHODS) interpolates the positions and
+    intensities between scan steps; use src.peaks.refine_peaks directly for
+    their uncertainties.
+    Returns:
+      peak_angles: detected 2θ positions,
+      peak_intensities: intensities at those positions.
+    """
+    peaks = _find_peak_indices(two_theta, intensity, height_frac, prominence, detector)
+    if refine:
+        refined = refine_peaks(two_theta, intensity, peaks, refine)
+        return refined.positions, refined.intensities
+    return two_theta[peaks], intensity[peaks]
+
+def detect_peaks_stack(two_theta, intensities, height_frac=0.001, prominence=1):
+    """
+    detect_peaks for a (patterns, points) stack of scans sharing the 2θ grid
+    two_theta, e.g. a temperature ramp, computed for all patterns at once.
+    Returns:
+      peak_angles, peak_intensities: lists with one array per pattern.
+    """
+    intensities = np.atleast_2d(np.asarray(intensities, dtype=float))
+    peaks = find_peaks_stack(intensities, height_frac, prominence)
+    return ([two_theta[p] for p in peaks],
+            [row[p] for row, p in zip(intensities, peaks)])
+
+def get_allowed_reflections(structure, n_reflections=5):
+    """
+    Return the first n_reflections allowed reflections of a cubic crystal as a list
+    of tuples (Q, Miller label), generated from the lattice's extinction rules.
+    For fcc:
+      (111): Q=3, (200): Q=4, (220): Q=8, (311): Q=11, (222): Q=12, ...
+    For bcc:
+      (110): Q=2, (200): Q=4, (211): Q=6, (220): Q=8, (310): Q=10, ...
+    sc and diamond are supported as well; see src/reflections.py.
+    """
+    return first_reflections(structure.lower(), n_reflections)
+
+def perform_regression(sin2_theta, reflections, wavelength):
+    """
+    Performs a linear regression of sin²θ versus theoretical Q values.
+    Returns:
+      slope, intercept, r_squared, and the calculated lattice constant.
+    """
+    n_reflections = min(len(reflections), len(sin2_theta))
+    Q_theoretical = np.array([reflections[i][0] for i in range(n_reflections)])
+    sin2_theta_used = sin2_theta[:n_reflections]
+    slope, intercept, r_squared = fit_lines(Q_theoretical, sin2_theta_used)
+    slope, intercept, r_squared = float(slope), float(intercept), float(r_squared)
+    # Calculate lattice constant using a = λ/(2*sqrt(slope))
+    a = wavelength / (2 * np.sqrt(slope))
+    return slope, intercept, r_squared, a, Q_theoretical, sin2_theta_used
+
+@dataclass(slots=True)
+class StructureFit:
+    """
+    Linear fit of sin²θ versus Q for one candidate structure. peak_indices are
+    the (sorted) peaks paired with Q_theoretical, and assignment_cost the cost of
+    the optimal peak assignment (NaN for sequential pairing).
+    """
+    structure: str
+    slope: float
+    intercept: float
+    r_squared: float
+    lattice_constant: float
+    Q_theoretical: np.ndarray
+    sin2_used: np.ndarray
+    miller_labels: list
+    peak_indices: np.ndarray = None
+    assignment_cost: float = float('nan')
+
+@dataclass(slots=True)
+class PatternAnalysis:
+    """
+    Result of analyze_pattern: detected peaks, the fit of every candidate
+    structure and the structure with the highest R². The peak uncertainties
+    are only set when the peaks are refined, background only when it was
+    subtracted and profiles (src.profiles.PeakProfiles, in peak order) only
+    when the peak profiles were fitted.
+    """
+    peak_angles: np.ndarray
+    peak_intensities: np.ndarray
+    fits: dict = field(default_factory=dict)
+    best_structure: str = None
+    peak_angle_errors: np.ndarray = None
+    peak_intensity_errors: np.ndarray = None
+    background: np.ndarray = None
+    profiles: tuple = None
+
+    @property
+    def best(self):
+        return self.fits[self.best_structure]
+
+    def summary(self):
+        """
+        One summary row: best structure, lattice constant, R² and peak count.
+        """
+        return {
+            'structure': self.best_structure,
+            'lattice_constant': float(self.best.lattice_constant),
+            'r_squared': float(self.best.r_squared),
+            'n_peaks': len(self.peak_angles),
+        }
+
+def _optimal_fit(structure, sin2_theta, wavelength):
+    """
+    Fit one structure using the optimal peak-to-reflection assignment.
+    """
+    reflections = get_allowed_reflections(structure, 2 * len(sin2_theta) + 5)
+    Q = np.array([q for q, _ in reflections])
+    peaks, refls, cost = assign_peaks(sin2_theta, Q)
+    slope, intercept, r_squared = (float(v) for v in fit_lines(Q[refls], sin2_theta[peaks]))
+    with np.errstate(invalid='ignore'):
+        a = float(wavelength / (2 * np.sqrt(slope)))
+    return StructureFit(structure, slope, intercept, r_squared, a, Q[refls].astype(int),
+                        sin2_theta[peaks], [reflections[j][1] for j in refls], peaks, cost)
+
+def analyze_pattern(two_theta, intensity, wavelength=0.7107, structures=('fcc', 'bcc'),
+                    height_frac=0.001, prominence=1, assignment='sequential', refine=None,
+                    detector='find_peaks', kalpha2=None, background=None, profile=None):
+    """
+    Detect peaks and fit sin²θ versus Q for every candidate structure.
+    wavelength is the X-ray wavelength in Å (default: Mo Kα). structures may be
+    any of src.reflections.LATTICES; enough reflections are generated to index
+    every detected peak (at least five).
+    assignment='sequential' pairs the n-th peak with the n-th reflection and picks
+    the structure with the highest R². assignment='optimal' uses
+    src.assignment.assign_peaks, which tolerates extra peaks and missing
+    reflections, and picks the structure with the lowest assignment cost.
+    refine (one of src.peaks.REFINE_METHODS) interpolates the peak positions
+    between scan steps and records their uncertainties. detector selects the
+    peak detector as in detect_peaks. kalpha2, a (λ1, λ2, ratio) triple, strips
+    the Kα2 doublet lines before detection (src.kalpha.strip_kalpha2); the peaks
+    are then Kα1 lines, so wavelength should be λ1. Stripping lowers the peaks
+    (unresolved ones by up to 1 / (1 + ratio)), so prominence is scaled by the
+    drop of the strongest point of the pattern, keeping the threshold relative
+    to the pattern as height_frac is. background (one of
+    src.background.BACKGROUNDS) is estimated and subtracted before that, and
+    kept in the result for reuse. profile (one of src.profiles.PROFILES) fits
+    every detected peak for its FWHM, area and their errors.
+    Returns:
+      a PatternAnalysis with the peaks sorted by 2θ, a StructureFit per structure
+      and the best structure.
+    """
+    background_estimate = None
+    if background:
+        background_estimate = estimate_background(two_theta, intensity, background)
+        intensity = intensity - background_estimate
+    if kalpha2 is not None:
+        lambda1, lambda2, ratio = kalpha2
+        peak_max = intensity.max()
+        intensity = strip_kalpha2(two_theta, intensity, lambda1, lambda2, ratio)
+        if peak_max > 0:
+            prominence = prominence * max(intensity.max(), 0) / peak_max
+    peaks = _find_peak_indices(two_theta, intensity, height_frac, prominence, detector)
+    angle_errors = intensity_errors = None
+    if refine:
+        peak_angles, peak_intensities, angle_errors, intensity_errors = refine_peaks(
+            two_theta, intensity, peaks, refine)
+    else:
+        peak_angles, peak_intensities = two_theta[peaks], intensity[peaks]
+    order = np.argsort(peak_angles)
+    peak_angles, peak_intensities = peak_angles[order], peak_intensities[order]
+    if refine:
+        angle_errors, intensity_errors = angle_errors[order], intensity_errors[order]
+    profiles = fit_peaks(two_theta, intensity, peaks[order], profile) if profile else None
+    theta_deg = peak_angles / 2.0
+    theta_rad = np.deg2rad(theta_deg)
+    sin2_theta = np.sin(theta_rad)**2
+
+    result = PatternAnalysis(peak_angles, peak_intensities, peak_angle_errors=angle_errors,
+                             peak_intensity_errors=intensity_errors, background=background_estimate,
+                             profiles=profiles)
+    if assignment == 'optimal':
+        for structure in structures:
+            result.fits[structure] = _optimal_fit(structure, sin2_theta, wavelength)
+        r_squared = np.array([result.fits[s].r_squared for s in structures])
+        if np.all(np.isnan(r_squared)):
+            raise ValueError(f"Found {len(peak_angles)} peak(s); at least two are needed to fit a structure.")
+        scores = [(result.fits[s].assignment_cost, -np.nan_to_num(result.fits[s].r_squared, nan=-1.0))
+                  for s in structures]
+        result.best_structure = structures[min(range(len(structures)), key=scores.__getitem__)]
+        return result
+    if assignment != 'sequential':
+        raise ValueError("assignment must be 'sequential' or 'optimal'.")
+
+    n_reflections = max(5, len(peak_angles))
+    reflection_sets = [get_allowed_reflections(structure, n_reflections) for structure in structures]
+    fits = fit_structures([sin2_theta], reflection_sets, wavelength)
+    for j, (structure, reflections) in enumerate(zip(structures, reflection_sets)):
+        n_used = fits['n_used'][0, j]
+        result.fits[structure] = StructureFit(
+            structure, float(fits['slope'][0, j]), float(fits['intercept'][0, j]),
+            float(fits['r_squared'][0, j]), float(fits['lattice_constant'][0, j]),
+            np.array([q for q, _ in reflections[:n_used]]), sin2_theta[:n_used],
+            [label for _, label in reflections[:n_used]], np.arange(n_used)
+        )
+
+    r_squared = fits['r_squared'][0]
+    if np.all(np.isnan(r_squared)):
+        raise ValueError(f"Found {len(peak_angles)} peak(s); at least two are needed to fit a structure.")
+    result.best_structure = structures[int(np.nanargmax(r_squared))]
+    return result
@@ -0,0 +1,116 @@
+"""
+Optimal assignment of observed peaks to allowed reflections.
+
+Pairing the n-th peak with the n-th reflection breaks as soon as one peak is
+spurious or one reflection is missing. Since sin²θ ≈ slope * Q + intercept is
+monotonic in Q, the best assignment is an order-preserving alignment of the
+sorted peaks with the sorted reflections. It is found by dynamic programming,
+like an edit distance: a matched pair costs its squared relative residual
+(capped by the cost of dropping the peak), an unmatched (extra) peak costs
+extra_peak_cost, and a reflection skipped between matched ones (missing)
+costs missing_reflection_cost. Reflections below the first or above the last
+matched peak are free.
+
+The alignment is solved for many trial slopes at once: each DP row is a
+vectorized update over (slopes × reflections), and skipped reflections are
+handled with a running minimum, so the cost is O(peaks × slopes × reflections)
+array work.
+"""
+
+import numpy as np
+from src.regression import fit_lines
+
+def _align(y, Q, slopes, intercepts, tol, extra_peak_cost, missing_reflection_cost):
+    """
+    Order-preserving alignment of peaks y (sorted sin²θ) with reflections Q for
+    every (slope, intercept) trial line.
+    Returns:
+      cost: (trials,) optimal alignment costs,
+      matches: list of (peak_indices, reflection_indices) per trial.
+    """
+    n_peaks, n_refl, n_trials = len(y), len(Q), len(slopes)
+    predicted = slopes[:, None] * Q[None, :] + intercepts[:, None]            # (T, R)
+    residual = (y[:, None, None] - predicted[None, :, :]) / (tol * y[:, None, None])
+    match_cost = np.minimum(residual**2, 2 * extra_peak_cost)                  # (P, T, R)
+
+    # D[t, j] (for the current peak count i): best cost of aligning the first i
+    # peaks with the first j reflections with at least one matched pair. The
+    # no-match alternative always costs i * extra_peak_cost.
+    columns = np.arange(1, n_refl + 1)
+    ramp = missing_reflection_cost * columns
+    D = np.full((n_trials, n_refl + 1), np.inf)
+    source = np.empty((n_peaks, n_trials, n_refl), dtype=int)    # column where the skip chain starts
+    matched = np.empty((n_peaks, n_trials, n_refl), dtype=bool)  # match (True) or extra peak
+    first = np.empty((n_peaks, n_trials, n_refl), dtype=bool)    # match is the first one
+    for i in range(n_peaks):
+        no_match = i * extra_peak_cost  # all previous peaks extra, leading reflections free
+        first[i] = no_match <= D[:, :-1]
+        match = np.minimum(D[:, :-1], no_match) + match_cost[i]
+        skip_peak = D[:, 1:] + extra_peak_cost
+        matched[i] = match <= skip_peak
+        candidate = np.minimum(match, skip_peak)
+        # Skipping reflections costs missing_reflection_cost each; a running
+        # minimum of candidate - ramp turns the chain of skips into one scan.
+        shifted = candidate - ramp
+        running = np.minimum.accumulate(shifted, axis=1)
+        source[i] = np.maximum.accumulate(np.where(shifted == running, columns, 0), axis=1)
+        D = np.concatenate([np.full((n_trials, 1), np.inf), running + ramp], axis=1)
+
+    # Trailing reflections are free: take the best end column.
+    end = np.argmin(D, axis=1)
+    cost = D[np.arange(n_trials), end]
+    no_match = n_peaks * extra_peak_cost
+
+    matches = []
+    for t in range(n_trials):
+        peaks, refls = [], []
+        i, j = n_peaks, end[t]
+        if cost[t] >= no_match:
+            cost[t] = no_match
+            i = 0
+        while i > 0:
+            j = source[i - 1][t, j - 1]
+            if matched[i - 1][t, j - 1]:
+                peaks.append(i - 1)
+                refls.append(j - 1)
+                if first[i - 1][t, j - 1]:
+                    break
+                j -= 1
+            i -= 1
+        matches.append((np.array(peaks[::-1], dtype=int), np.array(refls[::-1], dtype=int)))
+    return cost, matches
+
+def assign_peaks(sin2_theta, Q, tol=0.01, extra_peak_cost=1.0, missing_reflection_cost=0.5,
+                 n_trial_peaks=4, n_trial_reflections=8, n_refine=2):
+    """
+    Choose the peak-to-reflection assignment with the lowest alignment cost,
+    allowing for extra peaks and missing reflections.
+    sin2_theta are the sorted sin²θ of the peaks and Q the sorted Q values of the
+    allowed reflections. Trial slopes come from pairing each of the first
+    n_trial_peaks peaks with each of the first n_trial_reflections reflections;
+    each trial's assignment is refined n_refine times by refitting the line to
+    its matched pairs.
+    Returns:
+      peak_indices, reflection_indices: matched pairs (index arrays),
+      cost: the alignment cost of the chosen assignment.
+    """
+    y = np.asarray(sin2_theta, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    if len(y) == 0 or len(Q) == 0:
+        return np.array([], dtype=int), np.array([], dtype=int), np.inf
+
+    slopes = (y[:n_trial_peaks, None] / Q[None, :n_trial_reflections]).ravel()
+    intercepts = np.zeros_like(slopes)
+    for _ in range(n_refine + 1):
+        cost, matches = _align(y, Q, slopes, intercepts, tol, extra_peak_cost, missing_reflection_cost)
+        refined_slopes, refined_intercepts = slopes.copy(), intercepts.copy()
+        for t, (peaks, refls) in enumerate(matches):
+            if len(peaks) >= 2:
+                slope, intercept, _ = fit_lines(Q[refls], y[peaks])
+                if np.isfinite(slope) and slope > 0:
+                    refined_slopes[t], refined_intercepts[t] = slope, intercept
+        slopes, intercepts = refined_slopes, refined_intercepts
+
+    best = int(np.argmin(cost))
+    peaks, refls = matches[best]
+    return peaks, refls, float(cost[best])
@@ -0,0 +1,119 @@
+"""
+Background estimation for powder patterns.
+
+Three estimators, all working on one pattern or on a (patterns, points) stack
+along the last axis:
+  snip          statistics-sensitive non-linear iterative peak clipping
+                (Ryan et al., 1988): every point is clipped to the mean of its
+                neighbours k points away, for k = 1 ... half_window. Each pass
+                is one vectorized minimum over the whole array.
+  rolling_ball  grey opening with a flat window of 2 * half_window + 1 points,
+                smoothed by a moving average of the same width.
+  polynomial    iterative polynomial fit (modpoly, Lieber and Mahadevan-Jansen,
+                2003): the data are repeatedly replaced by min(data, fit) until
+                the fit stops moving. The least-squares projection is
+                precomputed, so every iteration is a matrix product.
+estimate_background picks one by name and converts the largest peak width,
+given in degrees 2θ, to a window in points.
+"""
+
+import numpy as np
+
+BACKGROUNDS = ('snip', 'rolling_ball', 'polynomial')
+
+def _lls(intensity):
+    """
+    Log-log-square-root transform used by SNIP to compress peaks.
+    """
+    return np.log(np.log(np.sqrt(intensity + 1) + 1) + 1)
+
+def _inverse_lls(transformed):
+    return (np.exp(np.exp(transformed) - 1) - 1)**2 - 1
+
+def snip(intensity, half_window=20, lls=True):
+    """
+    SNIP background with clipping windows up to half_window points. lls applies
+    the log-log-square-root transform first, which follows the background
+    better under strong peaks.
+    Returns:
+      the background, with the shape of intensity.
+    """
+    intensity = np.asarray(intensity, dtype=float)
+    offset = intensity.min(axis=-1, keepdims=True)
+    values = _lls(intensity - offset) if lls else intensity.copy()
+    n = values.shape[-1]
+    for k in range(1, min(half_window, (n - 1) // 2) + 1):
+        mean = (values[..., :-2 * k] + values[..., 2 * k:]) / 2
+        np.minimum(values[..., k:-k], mean, out=values[..., k:-k])
+    return (_inverse_lls(values) + offset) if lls else values
+
+def rolling_ball(intensity, half_window=20, smooth_half_window=None):
+    """
+    Rolling-ball background: a grey opening (erosion then dilation) with a flat
+    window of 2 * half_window + 1 points, smoothed by a moving average of
+    2 * smooth_half_window + 1 points (default: half_window).
+    Returns:
+      the background, with the shape of intensity.
+    """
+    from scipy.ndimage import grey_opening, uniform_filter1d
+    intensity = np.asarray(intensity, dtype=float)
+    size = [1] * (intensity.ndim - 1) + [2 * half_window + 1]
+    opened = grey_opening(intensity, size=size, mode='nearest')
+    if smooth_half_window is None:
+        smooth_half_window = half_window
+    return uniform_filter1d(opened, 2 * smooth_half_window + 1, axis=-1, mode='nearest')
+
+def polynomial(two_theta, intensity, degree=4, max_iter=200, tol=1e-4):
+    """
+    Iterative polynomial background of the given degree. Iteration stops when
+    the relative change of every pattern's clipped data is below tol.
+    Returns:
+      the background, with the shape of intensity.
+    """
+    two_theta = np.asarray(two_theta, dtype=float)
+    intensity = np.asarray(intensity, dtype=float)
+    # Scaling 2θ to [-1, 1] keeps the Vandermonde matrix well conditioned.
+    span = two_theta[-1] - two_theta[0]
+    x = 2 * (two_theta - two_theta[0]) / (span if span else 1) - 1
+    vander = np.vander(x, degree + 1)
+    pseudo_inverse = np.linalg.pinv(vander)                             # (degree + 1, n)
+    clipped = intensity.copy()
+    for _ in range(max_iter):
+        fit = (clipped @ pseudo_inverse.T) @ vander.T
+        updated = np.minimum(clipped, fit)
+        change = np.linalg.norm(updated - clipped, axis=-1) / np.linalg.norm(clipped, axis=-1)
+        clipped = updated
+        if np.all(change < tol):
+            break
+    return (clipped @ pseudo_inverse.T) @ vander.T
+
+def _smooth(intensity, half_window):
+    """
+    Moving average over 2 * half_window + 1 points along the last axis.
+    """
+    from scipy.ndimage import uniform_filter1d
+    return uniform_filter1d(np.asarray(intensity, dtype=float), 2 * half_window + 1, axis=-1,
+                            mode='nearest')
+
+def estimate_background(two_theta, intensity, method='snip', width=1.5, degree=4):
+    """
+    Background of a pattern (or a stack on the grid two_theta) with one of
+    BACKGROUNDS. width is the widest peak base to preserve, in degrees 2θ: the
+    clipping window reaches that far on either side of every point. degree is
+    used by the polynomial method only. All three methods follow the
+    lower envelope of the data, so counting noise would pull them down: the
+    data are first smoothed over a quarter of the clipping window.
+    Returns:
+      the background, with the shape of intensity.
+    """
+    two_theta = np.asarray(two_theta, dtype=float)
+    if method not in BACKGROUNDS:
+        raise ValueError(f"method must be one of {', '.join(BACKGROUNDS)}.")
+    step = np.median(np.diff(two_theta)) if len(two_theta) > 1 else 1.0
+    half_window = max(1, int(round(width / step)))
+    smoothed = _smooth(intensity, half_window // 4)
+    if method == 'snip':
+        return snip(smoothed, half_window)
+    if method == 'rolling_ball':
+        return rolling_ball(smoothed, half_window)
+    return polynomial(two_theta, smoothed, degree)
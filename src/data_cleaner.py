@@ -1,47 +1,306 @@
-import pandas as pd
 import numpy as np
 import glob
+import hashlib
+import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from src.filters import FILTERS, hampel_mask
+from src.pattern_cache import load_pattern, store_pattern
+from src.xy_reader import iter_xy_chunks
 
-def clean_data(raw_file):
+# Parameters of the cleaning step. Changing any of them invalidates the
+# filtered files recorded in the cleaning manifest.
+DEFAULT_PARAMS = {
+    'filter': 'hampel',
+    'min_two_theta': 10,
+    'window_size': 5,
+    'threshold_multiplier': 3,
+    'epsilon': 1e-6,
+}
+MANIFEST_NAME = ".clean_manifest.json"
+
+def resolve_params(params=None):
     """
-    Cleans a single raw data file and saves the filtered data.
-    For example, converts samples/Sample1.txt to samples/filtered_sample1.xy.
+    Merge params over DEFAULT_PARAMS and check the filter name.
     """
-    df = pd.read_csv(raw_file, sep="\t", header=None)
-    df = df[df[0] > 10]  # Filter condition on the first column
-    window_size = 5
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if params['filter'] not in FILTERS:
+        raise ValueError(f"Unknown filter '{params['filter']}'; choose from {', '.join(FILTERS)}.")
+    return params
 
-    # Compute rolling median and MAD for the intensity (column 1)
-    df["rolling_median"] = df[1].rolling(window=window_size, center=True).median()
-    df["rolling_mad"] = df[1].rolling(window=window_size, center=True).apply(
-        lambda x: np.median(np.abs(x - np.median(x))), raw=True
+def write_xy(path_or_file, two_theta, intensity):
+    """
+    Write 2θ/intensity as a tab-separated file without header or index.
+    pandas is imported here rather than at module level, as elsewhere in the
+    package, so importing the module stays cheap.
+    """
+    import pandas as pd
+    pd.DataFrame({0: two_theta, 1: intensity}).to_csv(
+        path_or_file, sep='\t', index=False, header=False
     )
-    df["difference"] = np.abs(df[1] - df["rolling_median"])
-    threshold_multiplier = 3
-    epsilon = 1e-6
-    df_filtered = df[df["difference"] <= threshold_multiplier * (df["rolling_mad"] + epsilon)].copy()
-
-    # Keep only the original two columns (2θ and intensity)
-    df_filtered = df_filtered[[0, 1]]
-    
-    # Create a filtered filename using the sample number from the raw file name.
+
+def filtered_path(raw_file):
+    """
+    Path of the filtered file for a raw file, e.g.
+    samples/Sample1.txt -> samples/filtered_sample1.xy.
+    """
     base = os.path.basename(raw_file)
     match = re.search(r'Sample(\d+)', base, re.IGNORECASE)
     sample_num = match.group(1) if match else "unknown"
-    filtered_filename = os.path.join(os.path.dirname(raw_file), f"filtered_sample{sample_num}.xy")
-    
-    # Save the cleaned data.
-    df_filtered.to_csv(filtered_filename, sep='\t', index=False, header=False)
-    print(f"Saved filtered data to {filtered_filename}")
+    return os.path.join(os.path.dirname(raw_file), f"filtered_sample{sample_num}.xy")
+
+def clean_data(raw_file, verbose=True, params=None, save=True):
+    """
+    Cleans a single raw data file and optionally saves the filtered data.
+    For example, converts samples/Sample1.txt to samples/filtered_sample1.xy.
+    params overrides entries of DEFAULT_PARAMS; params['filter'] selects the
+    outlier filter from src.filters.FILTERS.
+    Returns:
+      two_theta, intensity: the filtered data as float arrays.
+    """
+    params = resolve_params(params)
+    two_theta, intensity = load_pattern(raw_file)
+    in_range = two_theta > params['min_two_theta']  # Filter condition on 2θ
+    two_theta, intensity = two_theta[in_range], intensity[in_range]
+
+    # Reject intensity outliers with the selected filter (a rolling median/MAD
+    # Hampel filter by default)
+    keep = FILTERS[params['filter']](intensity, params['window_size'],
+                                     params['threshold_multiplier'], params['epsilon'])
+    two_theta, intensity = two_theta[keep], intensity[keep]
+
+    if save:
+        # Create a filtered filename using the sample number from the raw file name.
+        filtered_filename = filtered_path(raw_file)
+        write_xy(filtered_filename, two_theta, intensity)
+        store_pattern(filtered_filename, two_theta, intensity)
+        if verbose:
+            print(f"Saved filtered data to {filtered_filename}")
+    return two_theta, intensity
+
+def clean_data_streaming(raw_file, chunk_size=100_000, verbose=True, params=None):
+    """
+    Streaming version of clean_data for very long scans. The raw file is read in
+    chunks of chunk_size lines and filtered rows are appended to the output as
+    they are decided, so peak memory depends on chunk_size rather than scan length.
+    The last window_size - 1 points of each chunk are carried over to the next
+    one, which makes the output identical to clean_data's. Only the Hampel
+    filter is supported, since its support is exactly one window. Rows go to a
+    temporary file that replaces the filtered file only once the whole scan
+    has been read, so a malformed line leaves no truncated output behind.
+    Returns:
+      the path of the filtered file and the number of points kept.
+    """
+    params = resolve_params(params)
+    if params['filter'] != 'hampel':
+        raise ValueError("Streaming cleaning only supports the 'hampel' filter.")
+    window_size = params['window_size']
+    overlap = window_size - 1
+    half = window_size // 2
+    lag = overlap - half  # points at the end of a chunk still waiting for their window
+
+    filtered_filename = filtered_path(raw_file)
+    carry_tt = carry_i = np.empty(0)
+    decided = 0  # leading points of the carry that were already written or rejected
+    n_kept = 0
+    tmp_filename = f"{filtered_filename}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_filename, 'w', newline='') as out:
+            for two_theta, intensity in iter_xy_chunks(raw_file, chunk_size):
+                in_range = two_theta > params['min_two_theta']
+                two_theta = np.concatenate([carry_tt, two_theta[in_range]])
+                intensity = np.concatenate([carry_i, intensity[in_range]])
+                if len(intensity) < window_size:
+                    carry_tt, carry_i = two_theta, intensity
+                    continue
+
+                keep = hampel_mask(intensity, window_size,
+                                   params['threshold_multiplier'], params['epsilon'])
+                end = len(intensity) - lag
+                keep[:decided] = False
+                keep[end:] = False
+                write_xy(out, two_theta[keep], intensity[keep])
+                n_kept += int(np.count_nonzero(keep))
+                carry_tt = two_theta[len(two_theta) - overlap:]
+                carry_i = intensity[len(intensity) - overlap:]
+                decided = half
+        # Points left in the carry lack a full window and are rejected, as in clean_data.
+        os.replace(tmp_filename, filtered_filename)
+    except BaseException:
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+        raise
+
+    if verbose:
+        print(f"Saved filtered data to {filtered_filename}")
+    return filtered_filename, n_kept
+
+def file_hash(filename):
+    """
+    SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-def clean_all_raw_data(example_file):
+def load_manifest(directory):
+    """
+    Load the cleaning manifest of a directory, or an empty one if there is none
+    or it cannot be read.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(directory, manifest):
+    """
+    Atomically write the cleaning manifest of a directory.
+    """
+    path = os.path.join(directory, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _is_up_to_date(raw_file, entry, params):
+    """
+    Check a manifest entry against the raw file and cleaning parameters.
+    The raw file is only hashed when its size or mtime changed since the entry
+    was written, so unchanged directories are checked with a single stat per file.
+    Returns:
+      up_to_date flag and the raw file's (hash, size, mtime_ns).
+    """
+    stat = os.stat(raw_file)
+    if (entry is None or entry.get('params') != params
+            or not os.path.exists(os.path.join(os.path.dirname(raw_file), entry.get('output', '')))):
+        return False, (None, stat.st_size, stat.st_mtime_ns)
+    if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return True, (entry['hash'], stat.st_size, stat.st_mtime_ns)
+    digest = file_hash(raw_file)
+    return digest == entry.get('hash'), (digest, stat.st_size, stat.st_mtime_ns)
+
+def _manifest_entry(raw_file, filtered_file, params, fingerprint=(None, None, None)):
+    """
+    Manifest record for a freshly cleaned raw file. The output is stored
+    relative to the manifest's directory, so the record holds whatever the
+    working directory of later runs.
+    """
+    digest, size, mtime_ns = fingerprint
+    if size is None:
+        stat = os.stat(raw_file)
+        size, mtime_ns = stat.st_size, stat.st_mtime_ns
+    return {
+        'hash': digest or file_hash(raw_file),
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'params': params,
+        'output': os.path.relpath(filtered_file, os.path.dirname(raw_file) or os.curdir),
+    }
+
+def record_cleaned(raw_file, filtered_file, params=None):
+    """
+    Record a raw file cleaned outside clean_all_raw_data (e.g. by clean_data
+    directly) in its directory's manifest.
+    """
+    params = resolve_params(params)
+    directory = os.path.dirname(raw_file)
+    manifest = load_manifest(directory)
+    manifest[os.path.basename(raw_file)] = _manifest_entry(raw_file, filtered_file, params)
+    save_manifest(directory, manifest)
+
+def _clean_file(raw_file, params=None, chunk_size=None, digest=None):
+    """
+    Worker for clean_all_raw_data. Errors are returned instead of raised so that
+    one malformed file does not abort the rest of the batch. The raw file is
+    hashed here (unless its digest is already known), so that hashing runs in
+    the workers rather than serially in the parent.
+    Returns:
+      raw_file, the filtered file (None on failure), the error (None on
+      success) and the raw file's digest.
+    """
+    try:
+        if chunk_size:
+            clean_data_streaming(raw_file, chunk_size, verbose=False, params=params)
+        else:
+            clean_data(raw_file, verbose=False, params=params)
+        return raw_file, filtered_path(raw_file), None, digest or file_hash(raw_file)
+    except Exception as e:
+        return raw_file, None, f"{type(e).__name__}: {e}", None
+
+def clean_all_raw_data(example_file, workers=1, params=None, force=False, exclude=(), chunk_size=None):
     """
     Finds all raw data files in the same directory as example_file that match
     'Sample*.txt' and cleans each one.
+    workers sets the number of processes used; 1 cleans serially in this process
+    and None uses one process per CPU core. Progress is reported in file order.
+    A manifest in the directory records the hash of each raw file, the cleaning
+    parameters and the output path relative to the directory. Files whose
+    filtered output is up to date are skipped unless force is set; changing
+    params rebuilds every output. A file
+    whose size or mtime changed but whose contents did not (touch, cp, rsync)
+    is skipped and its entry refreshed, so the next run needs no hash again.
+    Raw files listed in exclude are left untouched. If chunk_size is given, files
+    are cleaned with clean_data_streaming using chunks of that many lines.
+    Returns:
+      a list of (raw_file, filtered_file, error) tuples, where error is None on
+      success and filtered_file is None on failure.
     """
+    params = resolve_params(params)
     directory = os.path.dirname(example_file)
-    raw_files = glob.glob(os.path.join(directory, "Sample*.txt"))
+    excluded = {os.path.abspath(f) for f in exclude}
+    raw_files = sorted(rf for rf in glob.glob(os.path.join(directory, "Sample*.txt"))
+                       if os.path.abspath(rf) not in excluded)
+    # With force the manifest is still loaded, so that the entries of excluded
+    # files survive; it is only ignored for the up-to-date check.
+    manifest = load_manifest(directory)
+
+    results = {}
+    stale = []
     for rf in raw_files:
-        clean_data(rf)
+        key = os.path.basename(rf)
+        up_to_date, fingerprint = _is_up_to_date(rf, None if force else manifest.get(key), params)
+        if up_to_date:
+            results[rf] = (rf, os.path.join(directory, manifest[key]['output']), None)
+            _, size, mtime_ns = fingerprint
+            manifest[key].update(size=size, mtime_ns=mtime_ns)
+        else:
+            stale.append((rf, fingerprint))
+    if results:
+        print(f"Skipped {len(results)} up-to-date file(s)")
+
+    n_files = len(stale)
+    stale_files = [rf for rf, _ in stale]
+    digests = [digest for _, (digest, _, _) in stale]
+    if workers == 1 or n_files <= 1:
+        outcomes = map(_clean_file, stale_files, repeat(params), repeat(chunk_size), digests)
+        executor = None
+    else:
+        n_workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=n_workers)
+        outcomes = executor.map(_clean_file, stale_files, repeat(params), repeat(chunk_size), digests,
+                                chunksize=max(1, n_files // (4 * n_workers)))
+
+    try:
+        for i, ((rf, filtered_file, error, digest), (_, (_, size, mtime_ns))) in enumerate(
+                zip(outcomes, stale), start=1):
+            key = os.path.basename(rf)
+            if error is None:
+                print(f"[{i}/{n_files}] Saved filtered data to {filtered_file}")
+                manifest[key] = _manifest_entry(rf, filtered_file, params, (digest, size, mtime_ns))
+            else:
+                print(f"[{i}/{n_files}] Failed to clean {rf}: {error}")
+                manifest.pop(key, None)
+            results[rf] = (rf, filtered_file, error)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        save_manifest(directory, manifest)
+    return [results[rf] for rf in raw_files]
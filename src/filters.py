@@ -0,0 +1,103 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Outlier filters used when cleaning raw data. Every filter takes the intensity
+# array and the same options (window_size, threshold_multiplier, epsilon) and
+# returns a boolean keep mask, so they can be swapped through FILTERS.
+# SciPy is imported inside the filters that need it to keep start-up fast.
+
+def _rolling_median_mad(intensity, window_size):
+    """
+    Centered rolling median and MAD over all full windows, computed in one batch
+    from a strided view.
+    Returns:
+      start: index of the first point with a full window,
+      rolling_median, rolling_mad: arrays with one entry per full window.
+    """
+    windows = sliding_window_view(intensity, window_size)
+    rolling_median = np.median(windows, axis=1)
+    rolling_mad = np.median(np.abs(windows - rolling_median[:, None]), axis=1)
+    return window_size // 2, rolling_median, rolling_mad
+
+def hampel_mask(intensity, window_size=5, threshold_multiplier=3, epsilon=1e-6):
+    """
+    Vectorized Hampel filter: flags points that lie within threshold_multiplier
+    rolling MADs of the centered rolling median.
+    All windows are taken from a strided view so the median and MAD are computed
+    in one batch instead of once per point. Points without a full window (the
+    edges) are rejected, matching pandas' rolling(center=True) behaviour.
+    Returns:
+      keep: boolean array, True for points that pass the filter.
+    """
+    intensity = np.asarray(intensity, dtype=float)
+    n = intensity.size
+    keep = np.zeros(n, dtype=bool)
+    if n < window_size:
+        return keep
+    start, rolling_median, rolling_mad = _rolling_median_mad(intensity, window_size)
+    center = intensity[start:start + len(rolling_median)]
+    difference = np.abs(center - rolling_median)
+    keep[start:start + len(rolling_median)] = difference <= threshold_multiplier * (rolling_mad + epsilon)
+    return keep
+
+def _residual_mask(intensity, baseline, window_size, threshold_multiplier, epsilon):
+    """
+    Keep points whose residual from a smooth baseline is within threshold_multiplier
+    rolling MADs of the intensity. Points without a full window are rejected, as
+    in hampel_mask.
+    """
+    keep = np.zeros(intensity.size, dtype=bool)
+    if intensity.size < window_size:
+        return keep
+    start, _, rolling_mad = _rolling_median_mad(intensity, window_size)
+    stop = start + len(rolling_mad)
+    difference = np.abs(intensity[start:stop] - baseline[start:stop])
+    keep[start:stop] = difference <= threshold_multiplier * (rolling_mad + epsilon)
+    return keep
+
+def savgol_mask(intensity, window_size=5, threshold_multiplier=3, epsilon=1e-6):
+    """
+    Savitzky–Golay residual filter: the baseline is a local quadratic fit
+    (savgol_filter), so peak flanks are followed more closely than by a median.
+    A spike several points wide pulls the fit up with it, so only part of it is
+    flagged at first: rejected points are replaced by their rolling median and
+    the baseline refitted until no further point is rejected.
+    Returns:
+      keep: boolean array, True for points that pass the filter.
+    """
+    from scipy.signal import savgol_filter
+    intensity = np.asarray(intensity, dtype=float)
+    if intensity.size < window_size:
+        return np.zeros(intensity.size, dtype=bool)
+    polyorder = min(2, window_size - 1)
+    start, rolling_median, _ = _rolling_median_mad(intensity, window_size)
+    median = intensity.copy()
+    median[start:start + len(rolling_median)] = rolling_median
+    keep = np.ones(intensity.size, dtype=bool)
+    for _ in range(window_size):
+        baseline = savgol_filter(np.where(keep, intensity, median), window_size, polyorder, mode='interp')
+        updated = keep & _residual_mask(intensity, baseline, window_size, threshold_multiplier, epsilon)
+        if np.array_equal(updated, keep):
+            break
+        keep = updated
+    return keep
+
+def morphological_mask(intensity, window_size=5, threshold_multiplier=3, epsilon=1e-6):
+    """
+    Morphological spike filter: an opening followed by a closing with a flat
+    structuring element of window_size - 1 points removes positive and negative
+    spikes narrower than that, and the result is used as the baseline.
+    Returns:
+      keep: boolean array, True for points that pass the filter.
+    """
+    from scipy.ndimage import grey_closing, grey_opening
+    intensity = np.asarray(intensity, dtype=float)
+    spike_width = max(1, window_size - 1)
+    baseline = grey_closing(grey_opening(intensity, size=spike_width), size=spike_width)
+    return _residual_mask(intensity, baseline, window_size, threshold_multiplier, epsilon)
+
+FILTERS = {
+    'hampel': hampel_mask,
+    'savgol': savgol_mask,
+    'morphological': morphological_mask,
+}
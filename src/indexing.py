@@ -0,0 +1,380 @@
+"""
+Auto-indexing of powder patterns for cubic, tetragonal, hexagonal and
+orthorhombic cells by successive dichotomy.
+
+In reciprocal space every system is linear in its cell parameters:
+Q = 1/d² = 4 sin²θ / λ² = coef(hkl) · p, with p = (1/a², ...) and
+  cubic:         h² + k² + l²             p = (1/a²)
+  tetragonal:    (h² + k², l²)            p = (1/a², 1/c²)
+  hexagonal:     (4/3 (h² + hk + k²), l²) p = (1/a², 1/c²)
+  orthorhombic:  (h², k², l²)             p = (1/a², 1/b², 1/c²)
+Because every coefficient is non-negative, a box of parameters [lo, hi] maps
+each hkl to the Q interval [coef · lo, coef · hi]. The 2θ zero shift is one
+more box dimension, which turns each observed line into a Q interval as well.
+A box is kept only if every observed line overlaps some hkl interval; kept
+boxes are halved until they are smaller than the line tolerance, and the
+survivors are refined by linear least squares and ranked by de Wolff's figure
+of merit M_N. Only primitive cells are searched: a centred lattice is found as
+its primitive (or conventional) cell.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import product
+from typing import NamedTuple
+import numpy as np
+
+SYSTEMS = {
+    'cubic': ('a',),
+    'tetragonal': ('a', 'c'),
+    'hexagonal': ('a', 'c'),
+    'orthorhombic': ('a', 'b', 'c'),
+}
+
+# Fewest lines (after max_unindexed) that can determine a system's cell: two per
+# cell length plus one for the zero shift. With fewer, the tolerance boxes of
+# the lines are satisfied by whole families of cells and the search only ends
+# at max_boxes.
+MIN_LINES = {system: 2 * len(lengths) + 1 for system, lengths in SYSTEMS.items()}
+
+# Default limit on the surviving boxes of one dichotomy level, per system. They
+# are well above what determined patterns need (hundreds to a few thousand for
+# one- and two-length cells, about 10⁵ for orthorhombic ones with few lines)
+# and cut the search short on pseudo-symmetric or too short line lists.
+MAX_BOXES = {
+    'cubic': 10_000,
+    'tetragonal': 20_000,
+    'hexagonal': 20_000,
+    'orthorhombic': 200_000,
+}
+
+# Cell volume as factor * prod(length ** power) over the lengths in SYSTEMS.
+_VOLUME = {
+    'cubic': (1.0, (3,)),
+    'tetragonal': (1.0, (2, 1)),
+    'hexagonal': (np.sqrt(3) / 2, (2, 1)),
+    'orthorhombic': (1.0, (1, 1, 1)),
+}
+
+@dataclass(slots=True)
+class IndexingSolution:
+    """
+    One indexed cell. cell holds the lengths named in SYSTEMS (Å), zero_shift
+    the refined 2θ zero error (degrees, subtracted from the observed angles)
+    and hkl one Miller label per line used ('' if the line is unindexed).
+    """
+    system: str
+    cell: tuple
+    volume: float
+    zero_shift: float
+    figure_of_merit: float
+    n_indexed: int
+    hkl: list = field(default_factory=list)
+
+class _Lines(NamedTuple):
+    two_theta: np.ndarray   # observed 2θ (degrees), sorted
+    q: np.ndarray           # observed Q = 1/d² (Å⁻²)
+    gradient: np.ndarray    # dQ/d(2θ) (Å⁻² per radian), for the zero shift
+    window: np.ndarray      # Q half-width of the 2θ tolerance
+    wavelength: float
+    tolerance: float
+
+def _to_Q(two_theta, wavelength):
+    """
+    Q = 1/d² = 4 sin²θ / λ² for 2θ in degrees.
+    """
+    return 4 * np.sin(np.deg2rad(np.clip(two_theta, 0, 180)) / 2)**2 / wavelength**2
+
+def _coefficients(system, n_max):
+    """
+    Distinct Q coefficient rows of a system for 0 ≤ h, k, l ≤ n_max, with one
+    representative hkl each.
+    Returns:
+      coef: (rows, parameters) array, hkl: (rows, 3) int array.
+    """
+    h, k, l = (a.ravel() for a in np.mgrid[0:n_max + 1, 0:n_max + 1, 0:n_max + 1])
+    if system == 'cubic':
+        coef = (h * h + k * k + l * l)[:, None].astype(float)
+        keep = (h >= k) & (k >= l)
+    elif system == 'tetragonal':
+        coef = np.stack([h * h + k * k, l * l], axis=1).astype(float)
+        keep = h >= k
+    elif system == 'hexagonal':
+        coef = np.stack([4 / 3 * (h * h + h * k + k * k), l * l], axis=1)
+        keep = h >= k
+    else:
+        coef = np.stack([h * h, k * k, l * l], axis=1).astype(float)
+        keep = np.ones(h.shape, dtype=bool)
+    keep &= coef.sum(axis=1) > 0
+    hkl = np.stack([h, k, l], axis=1)[keep]
+    coef, first = np.unique(coef[keep], axis=0, return_index=True)
+    return coef, hkl[first]
+
+def _covered(lo, hi, coef, lines, max_unindexed, max_cells=2_000_000):
+    """
+    Boxes [lo, hi] (boxes, parameters + zero shift) in which at most
+    max_unindexed lines fall outside every hkl interval.
+    For each box the hkl intervals are sorted by lower bound and the running
+    maximum of their upper bounds taken, so one searchsorted per line (over all
+    boxes at once, rows offset by a large constant) decides the overlap.
+    Returns:
+      boolean array over the boxes.
+    """
+    keep = np.empty(len(lo), dtype=bool)
+    chunk = max(1, max_cells // len(coef))
+    for start in range(0, len(lo), chunk):
+        lo_c, hi_c = lo[start:start + chunk], hi[start:start + chunk]
+        n_boxes = len(lo_c)
+        q_lo = _to_Q(lines.two_theta - hi_c[:, -1:] - lines.tolerance, lines.wavelength)
+        q_hi = _to_Q(lines.two_theta - lo_c[:, -1:] + lines.tolerance, lines.wavelength)
+        rows = coef[coef @ lo_c[:, :-1].min(axis=0) <= q_hi.max()]
+        Q_lo = lo_c[:, :-1] @ rows.T
+        Q_hi = hi_c[:, :-1] @ rows.T
+        order = np.argsort(Q_lo, axis=1)
+        Q_lo = np.take_along_axis(Q_lo, order, axis=1)
+        reach = np.maximum.accumulate(np.take_along_axis(Q_hi, order, axis=1), axis=1)
+        span = max(Q_lo[:, -1].max(), q_hi.max()) + 1.0
+        offsets = span * np.arange(n_boxes)[:, None]
+        position = np.searchsorted((Q_lo + offsets).ravel(), (q_hi + offsets).ravel(),
+                                   side='right').reshape(n_boxes, -1)
+        position -= len(rows) * np.arange(n_boxes)[:, None]
+        below = np.take_along_axis(reach, np.maximum(position - 1, 0), axis=1)
+        hit = (position > 0) & (below >= q_lo)
+        keep[start:start + chunk] = (~hit).sum(axis=1) <= max_unindexed
+    return keep
+
+def _volume(p, system):
+    """
+    Cell volume (Å³) for parameters p = 1/length² along the last axis.
+    """
+    factor, powers = _VOLUME[system]
+    return factor * np.prod(p ** (-np.array(powers) / 2), axis=-1)
+
+def _feasible(lo, hi, system, volume_range):
+    """
+    Boxes that can hold a cell with a volume in volume_range and, for
+    orthorhombic cells (reported sorted), a ≤ b ≤ c.
+    """
+    keep = ((_volume(hi[:, :-1], system) <= volume_range[1])
+            & (_volume(lo[:, :-1], system) >= volume_range[0]))
+    if system == 'orthorhombic':
+        keep &= (hi[:, 0] >= lo[:, 1]) & (hi[:, 1] >= lo[:, 2])
+    return keep
+
+def _bisect(lo, hi, axes):
+    """
+    Split every box in half along the given axes.
+    """
+    n_dims = lo.shape[1]
+    mid = (lo + hi) / 2
+    halves = np.zeros((2**len(axes), n_dims), dtype=bool)          # (children, dimensions)
+    halves[:, axes] = list(product((False, True), repeat=len(axes)))
+    new_lo = np.where(halves[None], mid[:, None], lo[:, None]).reshape(-1, n_dims)
+    new_hi = np.where(halves[None], hi[:, None], mid[:, None]).reshape(-1, n_dims)
+    return new_lo, new_hi
+
+def _dichotomy(system, lo, hi, coef, lines, resolution, max_unindexed, volume_range, max_boxes):
+    """
+    Successively halve the boxes that can index the lines until the cell
+    parameters are narrower than resolution (relative) and the zero shift than
+    the 2θ tolerance. More than max_boxes surviving boxes means the lines do not
+    constrain the cell, and raises ValueError.
+    Returns:
+      centres of the surviving boxes, (boxes, parameters + zero shift).
+    """
+    while len(lo):
+        keep = _feasible(lo, hi, system, volume_range)
+        lo, hi = lo[keep], hi[keep]
+        keep = _covered(lo, hi, coef, lines, max_unindexed)
+        lo, hi = lo[keep], hi[keep]
+        if len(lo) == 0:
+            break
+        wide = np.append(np.any((hi[:, :-1] - lo[:, :-1]) / lo[:, :-1] > resolution, axis=0),
+                         np.any(hi[:, -1] - lo[:, -1] > lines.tolerance))
+        if not wide.any():
+            break
+        if len(lo) > max_boxes:
+            raise ValueError(f"{len(lines.q)} lines do not determine the {system} cell; "
+                             "use more peaks, a smaller tolerance or a narrower length range.")
+        lo, hi = _bisect(lo, hi, np.flatnonzero(wide))
+    return (lo + hi) / 2
+
+def _assign(p, shift, coef, lines):
+    """
+    Nearest calculated line (coefficient row) of every zero-corrected observed line.
+    Returns:
+      rows, residuals (Q_obs - Q_calc).
+    """
+    q_corrected = lines.q - shift * lines.gradient
+    Q_calc = coef @ p
+    order = np.argsort(Q_calc)
+    Q_sorted = Q_calc[order]
+    right = np.clip(np.searchsorted(Q_sorted, q_corrected), 1, len(Q_sorted) - 1)
+    nearest = np.where(q_corrected - Q_sorted[right - 1] <= Q_sorted[right] - q_corrected,
+                       right - 1, right)
+    rows = order[nearest]
+    return rows, q_corrected - Q_calc[rows]
+
+def _refine(centre, coef, lines, resolution, max_unindexed, max_zero_shift, n_iterations=4):
+    """
+    Least-squares refinement of one trial cell (and the zero shift) against the
+    observed lines. The hkl window shrinks geometrically from the trial box size
+    to the 2θ tolerance over the iterations, so a line misassigned at first
+    drops out and is reassigned once the cell has improved.
+    Returns:
+      (p, zero shift in radians, indexed-line mask, assigned rows) or None if the
+      refined cell does not index the pattern.
+    """
+    p, shift = centre[:-1], np.deg2rad(centre[-1])
+    n_params = len(p)
+    first_window = 2 * lines.window + resolution * lines.q
+    for iteration in range(n_iterations):
+        window = first_window * (lines.window / first_window)**(iteration / (n_iterations - 1))
+        rows, residual = _assign(p, shift, coef, lines)
+        indexed = np.abs(residual) <= window
+        design = coef[rows[indexed]]
+        if max_zero_shift > 0:
+            design = np.column_stack([design, lines.gradient[indexed]])
+        if np.linalg.matrix_rank(design) < design.shape[1]:
+            break
+        solution = np.linalg.lstsq(design, lines.q[indexed], rcond=None)[0]
+        if np.any(solution[:n_params] <= 0):
+            return None
+        p = solution[:n_params]
+        shift = solution[-1] if max_zero_shift > 0 else 0.0
+
+    rows, residual = _assign(p, shift, coef, lines)
+    indexed = np.abs(residual) <= lines.window
+    if len(lines.q) - indexed.sum() > max_unindexed or abs(np.rad2deg(shift)) > max_zero_shift:
+        return None
+    return p, shift, indexed, rows
+
+def _figure_of_merit(q_corrected, Q_calc, indexed, rows):
+    """
+    de Wolff's M_N = Q_N / (2 ε N_calc): Q_N is the last observed line, ε the mean
+    |Q_obs - Q_calc| of the indexed lines and N_calc the number of distinct
+    calculated lines up to Q_N.
+    """
+    q_N = q_corrected[-1]
+    epsilon = np.mean(np.abs(q_corrected[indexed] - Q_calc[rows[indexed]]))
+    n_calc = len(np.unique(np.round(Q_calc[Q_calc <= q_N * (1 + 1e-9)], 9)))
+    return float(q_N / (2 * epsilon * n_calc)) if epsilon > 0 else np.inf
+
+def _solution(system, p, shift, indexed, rows, coef, hkl, lines):
+    """
+    Package a refined cell as an IndexingSolution.
+    """
+    cell = tuple(float(x) for x in 1 / np.sqrt(p))
+    q_corrected = lines.q - shift * lines.gradient
+    figure_of_merit = _figure_of_merit(q_corrected, coef @ p, indexed, rows)
+    labels = ['(' + ''.join(str(x) for x in hkl[r]) + ')' if ok else ''
+              for r, ok in zip(rows, indexed)]
+    return IndexingSolution(system, cell, float(_volume(p, system)), float(np.rad2deg(shift)),
+                            figure_of_merit, int(indexed.sum()), labels)
+
+def _index_boxes(system, lo, hi, volume_range, coef, hkl, lines, resolution, max_unindexed,
+                 max_zero_shift, max_boxes):
+    """
+    Run the dichotomy on a set of starting boxes within one volume shell and
+    refine the survivors.
+    Returns:
+      a list of IndexingSolution.
+    """
+    centres = _dichotomy(system, lo, hi, coef, lines, resolution, max_unindexed, volume_range,
+                         max_boxes)
+    # Neighbouring survivors converge to the same cell: refine one per grid cell
+    # a few boxes wide.
+    grid = np.column_stack([np.log(centres[:, :-1]) / (4 * resolution),
+                            centres[:, -1] / (4 * lines.tolerance)])
+    _, first = np.unique(np.round(grid), axis=0, return_index=True)
+    solutions = []
+    for centre in centres[np.sort(first)]:
+        refined = _refine(centre, coef, lines, resolution, max_unindexed, max_zero_shift)
+        if refined is not None:
+            solutions.append(_solution(system, *refined, coef, hkl, lines))
+    return solutions
+
+def _unique(solutions, rtol=1e-3):
+    """
+    Keep the best-ranked solution per cell, cells being compared on a grid of
+    relative size rtol.
+    """
+    kept = {}
+    for s in sorted(solutions, key=lambda s: -s.figure_of_merit):
+        kept.setdefault((s.system,) + tuple(np.round(np.log(s.cell) / rtol).astype(int)), s)
+    return list(kept.values())
+
+def index_pattern(peak_angles, wavelength=0.7107, systems=('cubic', 'tetragonal', 'hexagonal', 'orthorhombic'),
+                  tolerance=0.05, max_zero_shift=0.5, length_range=(2.0, 12.0), initial_step=0.5,
+                  volume_step=400.0, n_lines=20, max_unindexed=0, n_solutions=10, workers=1,
+                  max_boxes=None):
+    """
+    Auto-index a powder pattern from its peak positions.
+    peak_angles are the 2θ positions (degrees; the first n_lines after sorting
+    are used), wavelength is in Å, tolerance is the 2θ error allowed per line and
+    max_zero_shift the largest 2θ zero error searched and refined. Cell lengths
+    are searched within length_range (Å), starting from boxes initial_step Å
+    wide. As in DICVOL, the search runs in volume shells of volume_step Å³ from
+    small cells upwards and stops at the first shell with a solution, so the
+    many supercells of a large volume range are never expanded. With
+    workers > 1 the starting boxes of each shell are split over a process pool.
+    Systems with fewer than MIN_LINES lines (beyond max_unindexed) are skipped,
+    and a ValueError is raised if that leaves none. A ValueError is also raised
+    when the lines do not constrain a system (more than max_boxes boxes, by
+    default MAX_BOXES of the system, survive a level).
+    Returns:
+      up to n_solutions IndexingSolution, sorted by decreasing figure of merit.
+    """
+    for system in systems:
+        if system not in SYSTEMS:
+            raise ValueError(f"Crystal system must be one of {', '.join(SYSTEMS)}.")
+    two_theta = np.sort(np.asarray(peak_angles, dtype=float))[:n_lines]
+    if len(two_theta) < 2:
+        raise ValueError("At least two peaks are needed for indexing.")
+    n_usable = len(two_theta) - max_unindexed
+    determined = tuple(system for system in systems if n_usable >= MIN_LINES[system])
+    if not determined:
+        raise ValueError(f"{len(two_theta)} lines do not determine the {' or '.join(systems)} cell; "
+                         f"at least {min(MIN_LINES[s] for s in systems) + max_unindexed} are needed.")
+    systems = determined
+    q = _to_Q(two_theta, wavelength)
+    lines = _Lines(two_theta, q, 2 * np.sin(np.deg2rad(two_theta)) / wavelength**2,
+                   _to_Q(two_theta + tolerance, wavelength) - q, wavelength, tolerance)
+    # Relative box size at which hkl intervals are as narrow as the tightest line.
+    resolution = np.min(lines.window / q)
+
+    a_min, a_max = length_range
+    edges = np.arange(a_min, a_max + initial_step / 2, initial_step)
+    p_edges = 1 / edges**2                                        # decreasing
+    n_max = int(np.ceil(np.sqrt(_to_Q(two_theta[-1] + max_zero_shift + tolerance, wavelength)) * a_max))
+    starts = []
+    for system in systems:
+        coef, hkl = _coefficients(system, n_max)
+        cells = np.array(list(product(range(len(edges) - 1), repeat=len(SYSTEMS[system]))))
+        lo = np.column_stack([p_edges[cells + 1], np.full(len(cells), -max_zero_shift)])
+        hi = np.column_stack([p_edges[cells], np.full(len(cells), max_zero_shift)])
+        starts.append((system, lo, hi, coef, hkl))
+    max_volume = max(_volume(np.full(len(SYSTEMS[system]), 1 / a_max**2), system) for system in systems)
+
+    solutions = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for v0 in np.arange(0.0, max_volume, volume_step):
+            jobs = []
+            for system, lo, hi, coef, hkl in starts:
+                n_parts = max(1, min(workers, len(lo)))
+                for part in range(n_parts):
+                    jobs.append((system, lo[part::n_parts], hi[part::n_parts], (v0, v0 + volume_step),
+                                 coef, hkl, lines, resolution, max_unindexed, max_zero_shift,
+                                 max_boxes or MAX_BOXES[system]))
+            if executor is None:
+                results = [_index_boxes(*job) for job in jobs]
+            else:
+                results = list(executor.map(_index_boxes, *zip(*jobs)))
+            solutions += [s for result in results for s in result]
+            if solutions:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return _unique(solutions)[:n_solutions]
@@ -0,0 +1,104 @@
+"""
+Instrumental broadening from a reference standard.
+
+A well-crystallized standard (e.g. LaB6 or Si powder) adds no measurable
+broadening of its own, so the fitted widths of its peaks are the instrument's.
+They follow the Caglioti function (Caglioti, Paoletti and Ricci, 1958):
+  FWHM² = U tan²θ + V tanθ + W
+which is linear in U, V and W and is fitted by weighted least squares on FWHM².
+A fitted model is stored as a small JSON file named by a hash of its instrument
+configuration (a dict such as the wavelength, profile and slit settings), so
+later runs with the same configuration load it by name in O(1) instead of
+refitting the standard.
+"""
+
+import hashlib
+import json
+import os
+from typing import NamedTuple
+import numpy as np
+
+INSTRUMENT_DIR = ".instruments"
+
+class CagliotiModel(NamedTuple):
+    u: float
+    v: float
+    w: float
+    covariance: tuple
+    n_peaks: int
+    config: dict
+
+    def fwhm(self, two_theta):
+        """
+        Instrumental FWHM (degrees 2θ) at two_theta (degrees); zero where the
+        extrapolated FWHM² is negative.
+        """
+        tan_theta = np.tan(np.deg2rad(np.asarray(two_theta, dtype=float)) / 2)
+        return np.sqrt(np.maximum((self.u * tan_theta + self.v) * tan_theta + self.w, 0))
+
+def fit_caglioti(two_theta, fwhm, fwhm_errors=None, config=None):
+    """
+    Fit U, V and W to the peak widths of a standard. two_theta and fwhm are in
+    degrees 2θ; fwhm_errors, if given, weight every peak by the error of its
+    FWHM² (2 FWHM σ). Peaks with non-finite values are ignored.
+    Returns:
+      a CagliotiModel carrying config, with the covariance of (U, V, W).
+    """
+    two_theta = np.asarray(two_theta, dtype=float)
+    fwhm = np.asarray(fwhm, dtype=float)
+    sigma = np.ones_like(fwhm) if fwhm_errors is None else 2 * fwhm * np.asarray(fwhm_errors, dtype=float)
+    valid = np.isfinite(two_theta) & np.isfinite(fwhm) & (fwhm > 0) & np.isfinite(sigma) & (sigma > 0)
+    n_peaks = int(valid.sum())
+    if n_peaks < 3:
+        raise ValueError(f"Found {n_peaks} usable peak(s); at least three are needed for U, V and W.")
+    tan_theta = np.tan(np.deg2rad(two_theta[valid]) / 2)
+    design = np.stack([tan_theta**2, tan_theta, np.ones_like(tan_theta)], axis=1) / sigma[valid, None]
+    target = fwhm[valid]**2 / sigma[valid]
+    params, _, _, _ = np.linalg.lstsq(design, target, rcond=None)
+    residual = target - design @ params
+    # Without errors the scale comes from the residuals; with three peaks it is undefined.
+    dof = n_peaks - 3
+    scale = 1.0 if fwhm_errors is not None else (residual @ residual / dof if dof else np.nan)
+    covariance = np.linalg.pinv(design.T @ design) * scale
+    return CagliotiModel(*(float(p) for p in params), tuple(map(tuple, covariance.tolist())),
+                         n_peaks, dict(config or {}))
+
+def instrument_key(config):
+    """
+    Short hex digest identifying an instrument configuration (a JSON-serializable dict).
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def instrument_path(config, directory=INSTRUMENT_DIR):
+    return os.path.join(directory, f"caglioti-{instrument_key(config)}.json")
+
+def save_instrument(model, directory=INSTRUMENT_DIR):
+    """
+    Atomically store a model under its configuration's key.
+    Returns:
+      the path of the stored file.
+    """
+    path = instrument_path(model.config, directory)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(model._asdict(), f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+def load_instrument(config, directory=INSTRUMENT_DIR):
+    """
+    Load the model stored for an instrument configuration.
+    Returns:
+      the CagliotiModel, or None if there is none (or it cannot be read).
+    """
+    try:
+        with open(instrument_path(config, directory)) as f:
+            stored = json.load(f)
+        model = CagliotiModel(stored['u'], stored['v'], stored['w'],
+                              tuple(map(tuple, stored['covariance'])), stored['n_peaks'],
+                              stored['config'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    # Guard against hash collisions and files edited by hand.
+    return model if model.config == json.loads(json.dumps(config)) else None
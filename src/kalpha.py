@@ -0,0 +1,65 @@
+"""
+Kα2 stripping.
+
+Laboratory tubes emit a Kα1/Kα2 doublet, so every reflection appears twice:
+at 2θ1 from Kα1 and, weaker by the doublet ratio R (about 0.5), at the slightly
+higher angle 2θ2 = 2 arcsin(λ2 / λ1 sin θ1) from Kα2. The measured pattern is
+  I(x) = I1(x) + R I1(s(x)),   s(x) = 2 arcsin(λ1 / λ2 sin(x / 2)),
+where s(x) is the Kα1 angle whose Kα2 line lands on x. Rachinger's method
+solves this for I1 point by point, each point reusing already stripped ones.
+strip_kalpha2 unrolls the recursion instead:
+  I1(x) = I(x) - R I(s(x)) + R² I(s(s(x))) - ...
+which needs only linear interpolation of the measured data at the precomputed
+positions s^m(x), so all points (and all patterns of a stack on one grid) are
+stripped at once. The series is truncated once R^m drops below tol; positions
+below the first sample take its intensity.
+"""
+
+import numpy as np
+
+# Kα1 and Kα2 wavelengths in Å (Hölzer et al., 1997).
+KALPHA_LINES = {
+    'Mo': (0.709300, 0.713590),
+    'Cu': (1.540562, 1.544390),
+    'Co': (1.788965, 1.792850),
+    'Fe': (1.936042, 1.939980),
+    'Cr': (2.289700, 2.293606),
+    'Ag': (0.559421, 0.563813),
+}
+
+KALPHA2_RATIO = 0.5
+
+def kalpha2_angles(two_theta, lambda1, lambda2):
+    """
+    2θ at which the Kα2 line of a Kα1 reflection at two_theta (degrees) appears.
+    """
+    sin_theta = np.sin(np.deg2rad(np.asarray(two_theta, dtype=float)) / 2)
+    return np.rad2deg(2 * np.arcsin(np.minimum(lambda2 / lambda1 * sin_theta, 1.0)))
+
+def strip_kalpha2(two_theta, intensity, lambda1=KALPHA_LINES['Mo'][0], lambda2=KALPHA_LINES['Mo'][1],
+                  ratio=KALPHA2_RATIO, tol=1e-6):
+    """
+    Remove the Kα2 component of a pattern. two_theta must be increasing;
+    intensity is one pattern or a (patterns, points) stack on that grid.
+    Returns:
+      the Kα1-only intensity, with the shape of intensity.
+    """
+    if not 0 <= ratio < 1:
+        raise ValueError("ratio must be in [0, 1).")
+    two_theta = np.asarray(two_theta, dtype=float)
+    intensity = np.asarray(intensity, dtype=float)
+    stripped = intensity.copy()
+    if ratio == 0 or len(two_theta) < 2:
+        return stripped
+    n_terms = int(np.ceil(np.log(tol) / np.log(ratio)))
+    sin_scale = lambda1 / lambda2
+    position = two_theta
+    for m in range(1, n_terms):
+        position = np.rad2deg(2 * np.arcsin(sin_scale * np.sin(np.deg2rad(position) / 2)))
+        # Linear interpolation weights at the shifted positions, clamped to the grid.
+        upper = np.clip(np.searchsorted(two_theta, position), 1, len(two_theta) - 1)
+        lower = upper - 1
+        weight = np.clip((position - two_theta[lower]) / (two_theta[upper] - two_theta[lower]), 0, 1)
+        shifted = (1 - weight) * intensity[..., lower] + weight * intensity[..., upper]
+        stripped += (-ratio)**m * shifted
+    return stripped
@@ -0,0 +1,64 @@
+import glob
+import os
+import numpy as np
+from src.xy_reader import read_xy
+
+def _sidecar_prefix(filename):
+    directory, base = os.path.split(filename)
+    return os.path.join(directory, f".{base}.")
+
+def sidecar_path(filename, stat=None):
+    """
+    Path of the binary cache for a data file, keyed by the file's size and mtime,
+    e.g. samples/.Sample1.txt.8914-1792120558775556906.npy.
+    """
+    stat = stat or os.stat(filename)
+    return f"{_sidecar_prefix(filename)}{stat.st_size}-{stat.st_mtime_ns}.npy"
+
+def load_pattern(filename, use_cache=True):
+    """
+    Load a two-column diffraction file through a binary sidecar cache.
+    The first load parses the ASCII file with read_xy and stores the arrays as a
+    .npy file next to it; later loads memory-map that file instead of parsing.
+    A change in the source file's size or mtime invalidates the cache, and a
+    directory that is not writable simply falls back to parsing.
+    Returns:
+      two_theta, intensity: contiguous float64 arrays (read-only when cached).
+    """
+    if not use_cache:
+        return read_xy(filename)
+    cache_file = sidecar_path(filename)
+    try:
+        data = np.load(cache_file, mmap_mode='r')
+        return data[0], data[1]
+    except (OSError, ValueError):
+        pass
+
+    two_theta, intensity = read_xy(filename)
+    _write_sidecar(filename, cache_file, np.stack([two_theta, intensity]))
+    return two_theta, intensity
+
+def store_pattern(filename, two_theta, intensity):
+    """
+    Seed the sidecar cache of a data file that was just written from arrays
+    already in memory, so its first load does not need to parse it.
+    """
+    _write_sidecar(filename, sidecar_path(filename), np.stack([two_theta, intensity]))
+
+def _write_sidecar(filename, cache_file, data):
+    """
+    Atomically write a sidecar and remove the stale ones of the same source file.
+    """
+    stale = [f for f in glob.glob(glob.escape(_sidecar_prefix(filename)) + "*.npy") if f != cache_file]
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_file, cache_file)
+        for f in stale:
+            os.remove(f)
+    except OSError:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
@@ -0,0 +1,250 @@
+"""
+Peak detection and sub-step refinement of peak positions.
+
+find_peaks returns sample indices, so every peak position is snapped to the
+scan step. refine_peaks interpolates all peaks at once: the points around each
+peak are gathered into a (peaks, window) array and the position and height of
+every peak follow from one batched computation:
+  parabolic  vertex of the parabola through the maximum and its two neighbours,
+  centroid   intensity-weighted mean 2θ above the window's lower edge,
+  gaussian   vertex of a parabola fitted to ln(intensity) (Caruana's method).
+Uncertainties are propagated from the intensity noise, which is estimated from
+the data unless given.
+
+cwt_peaks is a multi-scale alternative to find_peaks for noisy, low-count
+scans: it thresholds the signal-to-noise ratio of a Ricker wavelet transform
+instead of absolute heights and prominences. The kernel FFTs are cached per
+grid length and step.
+
+find_peaks_stack runs find_peaks on a whole (patterns, points) stack of scans
+that share one 2θ grid in a single call, for temperature ramps and in-situ
+series.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+REFINE_METHODS = ('parabolic', 'centroid', 'gaussian')
+
+class RefinedPeaks(NamedTuple):
+    positions: np.ndarray
+    intensities: np.ndarray
+    position_errors: np.ndarray
+    intensity_errors: np.ndarray
+
+def noise_level(intensity):
+    """
+    Robust estimate of the white-noise standard deviation of a pattern from the
+    MAD of its second differences (which have variance 6σ²).
+    """
+    second = np.diff(np.asarray(intensity, dtype=float), 2)
+    if second.size == 0:
+        return 0.0
+    return float(1.4826 * np.median(np.abs(second - np.median(second))) / np.sqrt(6))
+
+def _windows(n, peaks, half_width):
+    """
+    (peaks, 2 * half_width + 1) indices centred on each peak, clipped to the data,
+    and a mask of the points that fall inside it.
+    """
+    offsets = np.arange(-half_width, half_width + 1)
+    index = peaks[:, None] + offsets[None, :]
+    inside = (index >= 0) & (index < n)
+    return np.clip(index, 0, n - 1), inside
+
+def _quadratic_vertex(x, y, weight):
+    """
+    Weighted least-squares parabolas y = A + B x + C x² along the last axis and
+    their vertices, with the vertex covariance propagated from the fit
+    (weight = 1 / variance of y).
+    Returns:
+      vertex x, vertex y, their standard errors, and a mask of valid maxima.
+    """
+    design = np.stack([np.ones_like(x), x, x * x], axis=-1)              # (P, W, 3)
+    normal = np.einsum('pwi,pw,pwj->pij', design, weight, design)
+    rhs = np.einsum('pwi,pw,pw->pi', design, weight, y)
+    valid = np.abs(np.linalg.det(normal)) > 0
+    normal[~valid] = np.eye(3)
+    covariance = np.linalg.inv(normal)
+    A, B, C = np.einsum('pij,pj->pi', covariance, rhs).T
+    valid &= C < 0
+    C = np.where(valid, C, -1.0)
+    vertex = -B / (2 * C)
+    height = A - B * B / (4 * C)
+    # Gradients of the vertex position and height with respect to (A, B, C).
+    d_vertex = np.stack([np.zeros_like(B), -1 / (2 * C), B / (2 * C * C)], axis=-1)
+    d_height = np.stack([np.ones_like(B), -B / (2 * C), B * B / (4 * C * C)], axis=-1)
+    vertex_error = np.sqrt(np.einsum('pi,pij,pj->p', d_vertex, covariance, d_vertex))
+    height_error = np.sqrt(np.einsum('pi,pij,pj->p', d_height, covariance, d_height))
+    return vertex, height, vertex_error, height_error, valid
+
+def refine_peaks(two_theta, intensity, peaks, method='parabolic', half_width=2, noise=None):
+    """
+    Refine the positions and heights of the peaks at sample indices peaks.
+    method is one of REFINE_METHODS; centroid and gaussian use 2 * half_width + 1
+    points per peak (parabolic always uses 3). noise is the standard deviation
+    of the intensity (default: estimated with noise_level). Peaks whose
+    refinement fails (e.g. at the edge of the data or on a flat top) keep their
+    sampled position, with half the local step as uncertainty.
+    Returns:
+      RefinedPeaks of positions, intensities and their standard errors.
+    """
+    if method not in REFINE_METHODS:
+        raise ValueError(f"Refinement method must be one of {', '.join(REFINE_METHODS)}.")
+    two_theta = np.asarray(two_theta, dtype=float)
+    intensity = np.asarray(intensity, dtype=float)
+    peaks = np.asarray(peaks, dtype=int)
+    sigma = noise_level(intensity) if noise is None else float(noise)
+    sigma = max(sigma, np.finfo(float).tiny)
+    n = len(intensity)
+
+    index, inside = _windows(n, peaks, 1 if method == 'parabolic' else half_width)
+    # Coordinates relative to the sampled maximum keep the fits well conditioned.
+    x = two_theta[index] - two_theta[peaks][:, None]
+    y = intensity[index]
+    step = np.abs(x[:, -1] - x[:, 0]) / np.maximum(inside.sum(axis=1) - 1, 1)
+
+    if method == 'centroid':
+        signal = np.where(inside, y - np.min(np.where(inside, y, np.inf), axis=1, keepdims=True), 0.0)
+        total = signal.sum(axis=1)
+        valid = total > 0
+        total = np.where(valid, total, 1.0)
+        offset = (signal * x).sum(axis=1) / total
+        offset_error = sigma * np.sqrt((((x - offset[:, None]) * inside)**2).sum(axis=1)) / total
+        height, height_error = intensity[peaks], np.full(len(peaks), sigma)
+    elif method == 'parabolic':
+        offset, height, offset_error, height_error, valid = _quadratic_vertex(
+            x, y, inside / sigma**2)
+        valid &= inside.all(axis=1)
+    else:
+        # ln(I) of the peak above the window's lower edge; Var(ln I) = σ² / I².
+        baseline = np.min(np.where(inside, y, np.inf), axis=1, keepdims=True)
+        signal = y - baseline
+        usable = inside & (signal > 0)
+        log_signal = np.log(np.where(usable, signal, 1.0))
+        offset, log_height, offset_error, log_height_error, valid = _quadratic_vertex(
+            x, log_signal, usable * signal**2 / sigma**2)
+        valid &= usable.sum(axis=1) >= 3
+        height = np.exp(np.where(valid, log_height, 0.0)) + baseline[:, 0]
+        height_error = (height - baseline[:, 0]) * log_height_error
+
+    # Fall back to the sampled maximum where the refinement is not meaningful.
+    valid &= np.abs(offset) <= step
+    positions = np.where(valid, two_theta[peaks] + offset, two_theta[peaks])
+    intensities = np.where(valid, height, intensity[peaks])
+    position_errors = np.where(valid, offset_error, step / 2)
+    intensity_errors = np.where(valid, height_error, sigma)
+    return RefinedPeaks(positions, intensities, position_errors, intensity_errors)
+
+# Peak detectors selectable in detect_peaks / analyze_pattern.
+DETECTORS = ('find_peaks', 'cwt')
+
+# Scales (FWHM-like widths in degrees 2θ) of the CWT detector.
+CWT_WIDTHS = (0.03, 0.05, 0.08, 0.12, 0.2, 0.3, 0.5)
+
+def _ricker(n_points, width):
+    """
+    Zero-mean Ricker (Mexican hat) wavelet of the given width in points.
+    """
+    t = np.arange(n_points) - (n_points - 1) / 2
+    kernel = (1 - (t / width)**2) * np.exp(-0.5 * (t / width)**2)
+    return kernel - kernel.mean()
+
+@lru_cache(maxsize=32)
+def _cwt_kernels(n, step, widths):
+    """
+    FFTs of the Ricker kernels for a grid of n points with the given step,
+    cached per (n, step, widths) so a series of scans on one grid pays for them
+    once.
+    Returns:
+      point widths (scales,), pad length and kernel FFTs (scales, n_fft // 2 + 1).
+    """
+    point_widths = np.unique(np.maximum(np.round(np.array(widths) / step, 1), 1.0))
+    support = int(np.ceil(5 * point_widths.max())) | 1
+    pad = support // 2
+    n_fft = 1 << int(np.ceil(np.log2(n + 2 * pad + support)))
+    kernels = np.zeros((len(point_widths), n_fft))
+    for i, width in enumerate(point_widths):
+        kernel = _ricker(support, width)
+        # Centre the kernel at index 0 (circularly) so the response is not shifted.
+        kernels[i, :support] = kernel
+        kernels[i] = np.roll(kernels[i], -pad)
+    return point_widths, pad, np.fft.rfft(kernels, axis=1)
+
+def cwt_peaks(two_theta, intensity, widths=CWT_WIDTHS, min_snr=5.0, min_ridge=3):
+    """
+    Multi-scale peak detection by a continuous wavelet transform with Ricker
+    wavelets. A peak is a local maximum of the best (over scales) signal-to-noise
+    ratio that is at least min_snr and is a local maximum at min_ridge or more
+    scales (a ridge line). Of candidates closer than the best-scale width of a
+    stronger one only the stronger is kept. The noise of every scale is the MAD
+    of its coefficients, so no absolute height or prominence has to be tuned.
+    widths are the scales in degrees 2θ.
+    Returns:
+      sample indices of the peaks (snapped to the intensity maximum), sorted.
+    """
+    intensity = np.asarray(intensity, dtype=float)
+    n = intensity.size
+    if n < 3:
+        return np.array([], dtype=int)
+    step = float(np.median(np.diff(two_theta)))
+    point_widths, pad, kernels = _cwt_kernels(n, round(step, 12), tuple(widths))
+    n_fft = 2 * (kernels.shape[1] - 1)
+    padded = np.pad(intensity, pad, mode='reflect' if n > pad else 'edge')
+    spectrum = np.fft.rfft(padded, n_fft)
+    coefficients = np.fft.irfft(spectrum[None, :] * kernels, n_fft, axis=1)[:, pad:pad + n]
+
+    mad = np.median(np.abs(coefficients - np.median(coefficients, axis=1, keepdims=True)), axis=1)
+    snr = coefficients / np.maximum(1.4826 * mad, np.finfo(float).tiny)[:, None]
+    local_max = np.zeros_like(snr, dtype=bool)
+    local_max[:, 1:-1] = (snr[:, 1:-1] > snr[:, :-2]) & (snr[:, 1:-1] >= snr[:, 2:]) & (snr[:, 1:-1] > 0)
+
+    # Ridge length: number of scales with a maximum within half a width.
+    ridge = np.zeros(n, dtype=int)
+    for scale, width in enumerate(point_widths):
+        reach = max(1, int(width // 2))
+        padded_max = np.pad(local_max[scale], reach)
+        ridge += sliding_window_view(padded_max, 2 * reach + 1).any(axis=1)
+    best = np.max(np.where(local_max, snr, 0.0), axis=0)
+    best_scale = np.argmax(np.where(local_max, snr, -np.inf), axis=0)
+
+    candidates = np.flatnonzero((best >= min_snr) & (ridge >= min_ridge))
+    # Snap every candidate to the intensity maximum within half its best width.
+    reach = np.maximum(1, (point_widths[best_scale[candidates]] // 2).astype(int))
+    offsets = np.arange(-reach.max(), reach.max() + 1) if len(candidates) else np.arange(1)
+    index = np.clip(candidates[:, None] + offsets[None, :], 0, n - 1)
+    values = np.where(np.abs(offsets)[None, :] <= reach[:, None], intensity[index], -np.inf)
+    positions = index[np.arange(len(candidates)), np.argmax(values, axis=1)]
+
+    # A broad peak is a maximum at several positions of its small scales; keep
+    # only the highest-SNR candidate within the best-scale width of another.
+    radius = point_widths[best_scale[candidates]]
+    kept = []
+    for i in np.argsort(-best[candidates], kind='stable'):
+        if all(abs(positions[i] - positions[j]) > radius[j] for j in kept):
+            kept.append(i)
+    return np.unique(positions[kept]).astype(int)
+
+def find_peaks_stack(intensities, height_frac=0.001, prominence=1):
+    """
+    find_peaks(height=max * height_frac, prominence=prominence) for every row of
+    a (patterns, points) intensity array at once. The rows are laid end to end,
+    separated by +inf samples: a separator is never a row's neighbouring maximum
+    and stops every prominence base search exactly where the row would end, so
+    a single find_peaks call with per-sample height thresholds (and an upper
+    bound that rejects the separators) finds the peaks of the whole stack. The
+    result is identical to calling find_peaks on every row.
+    Returns:
+      a list with the peak indices of every pattern (ragged).
+    """
+    from scipy.signal import find_peaks
+    stack = np.atleast_2d(np.asarray(intensities, dtype=float))
+    n_patterns, n = stack.shape
+    walled = np.pad(stack, ((0, 0), (0, 1)), constant_values=np.inf).ravel()
+    thresholds = np.repeat(stack.max(axis=1) * height_frac, n + 1)
+    peaks, _ = find_peaks(walled, height=(thresholds, np.finfo(float).max), prominence=prominence)
+    rows, cols = np.divmod(peaks, n + 1)
+    counts = np.bincount(rows, minlength=n_patterns)
+    return np.split(cols, np.cumsum(counts)[:-1])
@@ -1,7 +1,11 @@
 import powerxrd as xrd
 import matplotlib.pyplot as plt
+import numpy as np
 import os
 import re
+from src.background import estimate_background
+from src.pattern_cache import load_pattern
+from src.size import SCHERRER_K
 
 # Monkey-patch the Chart class __init__ to override default K and lambdaKa
 original_init = xrd.Chart.__init__
@@ -12,23 +16,34 @@ def new_init(self, x, y):
     what the FYSC23 PXRD course uses.
     '''
     original_init(self, x, y)
-    self.K = 0.94
+    self.K = SCHERRER_K
     self.lambdaKa = 0.07107 # nm
 
 xrd.Chart.__init__ = new_init
 
-def backsub_multiplt():
+def subtract_background(filename, background=None, method='snip'):
+    '''
+    Background-subtracted pattern of a data file, replacing Chart.backsub.
+    background is a background already computed on the file's grid (e.g. the
+    one kept by analyze_pattern); otherwise it is estimated with src.background.
+    Returns:
+      two_theta and the subtracted intensity (new arrays).
+    '''
+    two_theta, intensity = load_pattern(filename)
+    if background is None:
+        background = estimate_background(two_theta, intensity, method)
+    return np.array(two_theta), intensity - background
+
+def backsub_multiplt(method='snip'):
     fig, axs = plt.subplots(2, 1, figsize=(6,8), sharex=True)
     fig.subplots_adjust(hspace=0.3)
 
     for ax in axs:
         ax.tick_params(labelbottom=True)
 
-    # xrd.Data import tab-separated files (.xy) file with importfile()
     for i in range(2):
-        data = xrd.Data('samples/filtered_sample{}.xy'.format(i+1)).importfile()
-        chart = xrd.Chart(*data)
-        axs[i].plot(*chart.backsub(), color='k', label='Sample {}'.format(i+1))
+        two_theta, subtracted = subtract_background('samples/filtered_sample{}.xy'.format(i+1), method=method)
+        axs[i].plot(two_theta, subtracted, color='k', label='Sample {}'.format(i+1))
         axs[i].legend()
         axs[i].set_xlabel('2 $\\theta$ (deg)')
         axs[i].set_ylabel('Intensity (a.u.)')
@@ -38,10 +53,10 @@ def backsub_multiplt():
     plt.savefig('./figs/backsub_multiplt.pdf')
     plt.show()
 
-def all_peaks(filename):
-    data = xrd.Data(filename).importfile()
-    chart = xrd.Chart(*data)
-    chart.backsub(tol=1.0, show=True)
+def all_peaks(filename, background=None, method='snip'):
+    two_theta, subtracted = subtract_background(filename, background, method)
+    plt.plot(two_theta, subtracted)
+    chart = xrd.Chart(two_theta, subtracted)
     chart.allpeaks(tols=(0.1, 0.8), verbose=True, show=True)
     if filename == r'samples\filtered_sample1.xy':
         chart.SchPeak(xrange=[34.5,36.5], verbose=True, show=True)
@@ -62,10 +77,9 @@ def all_peaks(filename):
     plt.show()
 
 def test_sch():
-    data = xrd.Data('samples/filtered_sample1.xy').importfile()
-    chart = xrd.Chart(*data)
-
-    chart.backsub(tol=1.0, show=True)
+    two_theta, subtracted = subtract_background('samples/filtered_sample1.xy')
+    plt.plot(two_theta, subtracted)
+    chart = xrd.Chart(two_theta, subtracted)
     chart.SchPeak(xrange=[35, 36], verbose=True, show=True)
     plt.xlabel('2 $\\theta$')
     plt.title('backsub and Scherrer width calculation')
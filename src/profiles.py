@@ -0,0 +1,230 @@
+"""
+Profile fitting of all peaks of a pattern at once.
+
+Every peak gets a window of window * FWHM on either side of its position
+(FWHM estimated at half height). Overlapping windows are merged, so peaks
+whose tails overlap are fitted together, each group with its own linear
+background; a run of more than max_group overlapping peaks (typically noise
+detected as peaks) is split, so no group needs an oversized solve. All groups are padded to the same number of peaks and points and
+fitted simultaneously by Levenberg–Marquardt: residuals, the analytic
+Jacobian and the damped normal equations are (groups, ...) arrays, and the
+damping of every group adapts independently, so isolated peaks are fitted in
+parallel in one vectorized loop.
+
+Profiles, with u = (2θ - position) / FWHM:
+  gaussian      height * exp(-4 ln2 u²)
+  pseudo_voigt  height * (η / (1 + 4u²) + (1 - η) exp(-4 ln2 u²))
+Standard errors come from the covariance s² (JᵀJ)⁻¹ of each group, with s²
+the (optionally Poisson-weighted) residual variance; the area error is propagated from height, FWHM and η.
+"""
+
+from typing import NamedTuple
+import numpy as np
+
+PROFILES = ('gaussian', 'pseudo_voigt')
+
+_GAUSS = 4 * np.log(2)
+_GAUSS_AREA = np.sqrt(np.pi / _GAUSS)   # area / (height * FWHM) of a Gaussian
+_LORENTZ_AREA = np.pi / 2               # area / (height * FWHM) of a Lorentzian
+
+class PeakProfiles(NamedTuple):
+    positions: np.ndarray
+    fwhm: np.ndarray
+    areas: np.ndarray
+    heights: np.ndarray
+    eta: np.ndarray
+    position_errors: np.ndarray
+    fwhm_errors: np.ndarray
+    area_errors: np.ndarray
+    height_errors: np.ndarray
+    eta_errors: np.ndarray
+    converged: np.ndarray
+
+def _initial_fwhm(two_theta, intensity, peaks):
+    """
+    FWHM of every peak at half its height, in degrees 2θ.
+    """
+    from scipy.signal import peak_widths
+    _, _, left, right = peak_widths(intensity, peaks, rel_height=0.5)
+    samples = np.arange(len(two_theta))
+    return np.interp(right, samples, two_theta) - np.interp(left, samples, two_theta)
+
+def _groups(two_theta, positions, half_widths, max_group):
+    """
+    Merge overlapping fitting windows into groups of at most max_group peaks.
+    Returns:
+      group: the group index of every peak (peaks sorted by position),
+      start, stop: the sample range of every group.
+    """
+    low, high = positions - half_widths, positions + half_widths
+    reach = np.maximum.accumulate(high)
+    group = np.concatenate([[0], np.cumsum(low[1:] > reach[:-1])])
+    first = np.flatnonzero(np.diff(group, prepend=-1))
+    rank = np.arange(len(group)) - np.repeat(first, np.diff(np.append(first, len(group))))
+    group = np.cumsum((np.diff(group, prepend=-1) > 0) | (rank % max_group == 0)) - 1
+    first = np.flatnonzero(np.diff(group, prepend=-1))
+    start = np.searchsorted(two_theta, np.minimum.reduceat(low, first))
+    stop = np.searchsorted(two_theta, np.maximum.reduceat(high, first), side='right')
+    return group, start, stop
+
+def _evaluate(x, peaks, background, active, pseudo_voigt):
+    """
+    Model and Jacobian of every group.
+    x: (G, L) positions relative to the group centre; peaks: (G, P, 4) height,
+    position, FWHM and η of every peak slot; background: (G, 2) offset and slope.
+    Returns:
+      model (G, L) and Jacobian (G, L, 4P + 2), with zero columns for inactive
+      slots (and for η with Gaussian profiles).
+    """
+    height, centre, fwhm, eta = (peaks[..., i, None] for i in range(4))
+    u = (x[:, None, :] - centre) / fwhm                                   # (G, P, L)
+    gauss = np.exp(-_GAUSS * u * u)
+    lorentz = 1 / (1 + 4 * u * u)
+    shape = eta * lorentz + (1 - eta) * gauss
+    # Derivatives of the shape with respect to u, then by the chain rule.
+    d_shape_du = -2 * u * (4 * eta * lorentz * lorentz + _GAUSS * (1 - eta) * gauss)
+    d_height = shape
+    d_centre = -height * d_shape_du / fwhm
+    d_fwhm = -height * d_shape_du * u / fwhm
+    d_eta = height * (lorentz - gauss) if pseudo_voigt else np.zeros_like(u)
+    mask = active[..., None]
+    jacobian = np.stack([d_height, d_centre, d_fwhm, d_eta], axis=2) * mask[:, :, None]  # (G, P, 4, L)
+    n_groups, n_slots, _, n_points = jacobian.shape
+    jacobian = jacobian.reshape(n_groups, 4 * n_slots, n_points)
+    jacobian = np.concatenate([jacobian, np.ones_like(x)[:, None], x[:, None]], axis=1)
+    model = (height * shape * mask).sum(axis=1) + background[:, :1] + background[:, 1:] * x
+    return model, jacobian.transpose(0, 2, 1)
+
+def fit_peaks(two_theta, intensity, peaks, profile='pseudo_voigt', window=3.0, poisson=False,
+              max_iter=100, tol=1e-9, max_group=8):
+    """
+    Fit a profile (one of PROFILES) to the peaks at sample indices peaks.
+    window is the half-width of each peak's fitting window in initial FWHMs.
+    poisson weights every point by 1 / max(intensity, 1), as counting
+    statistics require; without it the fit is unweighted, and the errors of
+    tall peaks on a low background come out too small for raw counts.
+    max_group caps the number of peaks fitted jointly.
+    Returns:
+      PeakProfiles of positions, FWHMs, areas, heights and η (0 for Gaussian
+      profiles) with their standard errors, in the order of peaks, and whether
+      the fit of each peak's group converged (False if it stalled or ran out of
+      iterations).
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Profile must be one of {', '.join(PROFILES)}.")
+    pseudo_voigt = profile == 'pseudo_voigt'
+    two_theta = np.asarray(two_theta, dtype=float)
+    intensity = np.asarray(intensity, dtype=float)
+    peaks = np.asarray(peaks, dtype=int)
+    n_peaks = len(peaks)
+    if n_peaks == 0:
+        empty = np.array([])
+        return PeakProfiles(*[empty] * 10, np.array([], dtype=bool))
+
+    order = np.argsort(peaks)
+    sorted_peaks = peaks[order]
+    step = np.median(np.diff(two_theta)) if len(two_theta) > 1 else 1.0
+    fwhm = np.maximum(_initial_fwhm(two_theta, intensity, sorted_peaks), 2 * step)
+    positions = two_theta[sorted_peaks]
+    group, start, stop = _groups(two_theta, positions, window * fwhm, max_group)
+    n_groups = len(start)
+
+    # Padded (groups, points) samples and (groups, slots) peak table.
+    n_points = int((stop - start).max())
+    index = start[:, None] + np.arange(n_points)
+    valid = index < stop[:, None]
+    index = np.minimum(index, len(two_theta) - 1)
+    centre = (two_theta[start] + two_theta[stop - 1]) / 2
+    x = two_theta[index] - centre[:, None]
+    y = np.where(valid, intensity[index], 0.0)
+    weight = np.where(valid, 1 / np.sqrt(np.maximum(y, 1.0)) if poisson else 1.0, 0.0)
+    first = np.searchsorted(group, np.arange(n_groups))
+    slot = np.arange(n_peaks) - first[group]
+    n_slots = int(slot.max()) + 1
+    active = np.zeros((n_groups, n_slots), dtype=bool)
+    active[group, slot] = True
+
+    # Initial background through the window edges, heights above it.
+    last = np.maximum(valid.sum(axis=1) - 1, 0)
+    rows = np.arange(n_groups)
+    x0, x1, y0, y1 = x[:, 0], x[rows, last], y[:, 0], y[rows, last]
+    slope = np.where(x1 > x0, (y1 - y0) / np.where(x1 > x0, x1 - x0, 1), 0.0)
+    background = np.stack([y0 - slope * x0, slope], axis=1)
+    params = np.zeros((n_groups, n_slots, 4))
+    params[..., 2] = 1.0
+    params[group, slot, 0] = intensity[sorted_peaks] - (background[group, 0] + background[group, 1]
+                                                        * (positions - centre[group]))
+    params[group, slot, 1] = positions - centre[group]
+    params[group, slot, 2] = fwhm
+    params[group, slot, 3] = 0.5 if pseudo_voigt else 0.0
+
+    # Free parameters: 4 per active slot (3 for Gaussians) plus the background.
+    free = np.repeat(active, 4, axis=1)
+    if not pseudo_voigt:
+        free[:, 3::4] = False
+    free = np.concatenate([free, np.ones((n_groups, 2), dtype=bool)], axis=1)
+    n_free = free.sum(axis=1)
+    identity = np.eye(free.shape[1])
+
+    def residuals(params, background):
+        model, jacobian = _evaluate(x, params, background, active, pseudo_voigt)
+        return weight * (y - model), jacobian * weight[..., None]
+
+    residual, jacobian = residuals(params, background)
+    cost = (residual**2).sum(axis=1)
+    damping = np.full(n_groups, 1e-3)
+    converged = np.zeros(n_groups, dtype=bool)
+    stalled = np.zeros(n_groups, dtype=bool)   # damping blew up without a converged step
+    for _ in range(max_iter):
+        normal = np.einsum('gli,glj->gij', jacobian, jacobian)
+        gradient = np.einsum('gli,gl->gi', jacobian, residual)
+        diagonal = np.where(free, np.einsum('gii->gi', normal), 1.0)
+        # A parameter whose Jacobian column vanished (e.g. the height of a noise
+        # peak fitted to zero) would leave a zero row: floor its damping.
+        diagonal = np.maximum(diagonal, 1e-12 * diagonal.max(axis=1, keepdims=True))
+        damped = normal + (damping[:, None] * diagonal + ~free)[:, :, None] * identity
+        done = converged | stalled
+        delta = np.linalg.solve(damped, gradient[..., None])[..., 0] * free * ~done[:, None]
+        trial = params + delta[:, :-2].reshape(params.shape)
+        trial[..., 2] = np.maximum(trial[..., 2], step / 2)
+        trial[..., 3] = np.clip(trial[..., 3], 0, 1)
+        trial_background = background + delta[:, -2:]
+        trial_residual, trial_jacobian = residuals(trial, trial_background)
+        trial_cost = (trial_residual**2).sum(axis=1)
+        better = (trial_cost <= cost) & ~done
+        small = better & (cost - trial_cost <= tol * np.maximum(cost, np.finfo(float).tiny))
+        params = np.where(better[:, None, None], trial, params)
+        background = np.where(better[:, None], trial_background, background)
+        residual = np.where(better[:, None], trial_residual, residual)
+        jacobian = np.where(better[:, None, None], trial_jacobian, jacobian)
+        cost = np.where(better, trial_cost, cost)
+        damping = np.where(done, damping, np.where(better, damping / 10, damping * 10))
+        converged |= small
+        stalled |= ~converged & (damping > 1e12)
+        if (converged | stalled).all():
+            break
+
+    # Covariance of the free parameters, scaled by the residual variance.
+    normal = np.einsum('gli,glj->gij', jacobian, jacobian)
+    normal = np.where(free[:, :, None] & free[:, None, :], normal, identity)
+    dof = np.maximum(valid.sum(axis=1) - n_free, 1)
+    with np.errstate(invalid='ignore'):
+        covariance = np.linalg.pinv(normal) * (cost / dof)[:, None, None]
+    covariance *= free[:, :, None] & free[:, None, :]
+    variance = np.einsum('gii->gi', covariance)[:, :-2].reshape(n_groups, n_slots, 4)
+    errors = np.sqrt(np.maximum(variance, 0))[group, slot]
+
+    height, offset, width, eta = params[group, slot].T
+    # Area = height * FWHM * (η π/2 + (1 - η) √(π / 4 ln2)) and its gradient.
+    shape_area = eta * _LORENTZ_AREA + (1 - eta) * _GAUSS_AREA
+    areas = height * width * shape_area
+    block = covariance[:, :-2, :-2].reshape(n_groups, n_slots, 4, n_slots, 4)
+    peak_covariance = block[group, slot, :, slot, :]                       # (peaks, 4, 4)
+    gradient = np.stack([width * shape_area, np.zeros(n_peaks), height * shape_area,
+                         height * width * (_LORENTZ_AREA - _GAUSS_AREA)], axis=1)
+    area_errors = np.sqrt(np.maximum(np.einsum('pi,pij,pj->p', gradient, peak_covariance, gradient), 0))
+
+    inverse = np.argsort(order)
+    result = (offset + centre[group], width, areas, height, eta,
+              errors[:, 1], errors[:, 2], area_errors, errors[:, 0], errors[:, 3], converged[group])
+    return PeakProfiles(*(values[inverse] for values in result))
@@ -0,0 +1,86 @@
+"""
+Allowed reflections of cubic lattices.
+
+Reflection tables are generated from the extinction rules of each lattice over
+a vectorized hkl grid and memoized per (lattice, Q_max), where Q = h² + k² + l².
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+import numpy as np
+
+class Reflection(NamedTuple):
+    Q: int
+    hkl: tuple
+    label: str
+    multiplicity: int
+
+def _allowed(h, k, l, lattice):
+    """
+    Extinction rules: True where (h, k, l) is an allowed reflection.
+    """
+    if lattice == 'sc':
+        return np.ones(h.shape, dtype=bool)
+    if lattice == 'bcc':
+        return (h + k + l) % 2 == 0
+    unmixed = (h % 2 == k % 2) & (k % 2 == l % 2)
+    if lattice == 'fcc':
+        return unmixed
+    # diamond: fcc, minus the all-even reflections with h + k + l = 4n + 2
+    return unmixed & ~((h % 2 == 0) & ((h + k + l) % 4 == 2))
+
+# Lattices with generated reflection tables.
+LATTICES = ('sc', 'bcc', 'fcc', 'diamond')
+
+@lru_cache(maxsize=None)
+def reflection_table(lattice, Q_max):
+    """
+    All allowed reflection families of a cubic lattice with Q ≤ Q_max, sorted by Q.
+    Each family is listed once with its canonical Miller indices (h ≥ k ≥ l ≥ 0)
+    and its multiplicity (number of equivalent hkl).
+    Returns:
+      a tuple of Reflection(Q, hkl, label, multiplicity).
+    """
+    lattice = lattice.lower()
+    if lattice not in LATTICES:
+        raise ValueError(f"Structure type must be one of {', '.join(LATTICES)}.")
+    n = int(np.floor(np.sqrt(Q_max)))
+    h, k, l = (a.ravel() for a in np.mgrid[-n:n + 1, -n:n + 1, -n:n + 1])
+    Q = h * h + k * k + l * l
+    keep = (Q > 0) & (Q <= Q_max) & _allowed(h, k, l, lattice)
+    # Canonical family representative: absolute indices sorted in descending order.
+    hkl = -np.sort(-np.abs(np.stack([h[keep], k[keep], l[keep]], axis=1)), axis=1)
+    families, multiplicity = np.unique(hkl, axis=0, return_counts=True)
+    Q_family = (families**2).sum(axis=1)
+    order = np.lexsort((-families[:, 0], Q_family))
+    return tuple(
+        Reflection(int(Q_family[i]), tuple(int(x) for x in families[i]),
+                   '(' + ''.join(str(x) for x in families[i]) + ')', int(multiplicity[i]))
+        for i in order
+    )
+
+def reflections_by_Q(lattice, Q_max):
+    """
+    Allowed reflections merged per Q value, since families with the same Q (e.g.
+    (300) and (221)) fall at the same angle.
+    Returns:
+      a list of (Q, label, multiplicity) tuples sorted by Q; merged labels are
+      joined with '/' and their multiplicities summed.
+    """
+    merged = {}
+    for r in reflection_table(lattice, Q_max):
+        label, multiplicity = merged.get(r.Q, ('', 0))
+        merged[r.Q] = (f"{label}/{r.label}" if label else r.label, multiplicity + r.multiplicity)
+    return [(Q, label, multiplicity) for Q, (label, multiplicity) in merged.items()]
+
+def first_reflections(lattice, n_reflections):
+    """
+    The first n_reflections distinct-Q reflections of a lattice as (Q, label)
+    tuples, growing Q_max until enough are found.
+    """
+    Q_max = 16
+    while True:
+        reflections = reflections_by_Q(lattice, Q_max)
+        if len(reflections) >= n_reflections:
+            return [(Q, label) for Q, label, _ in reflections[:n_reflections]]
+        Q_max *= 2
@@ -0,0 +1,97 @@
+"""
+Batched linear regression of sin²θ versus Q.
+
+For a cubic lattice sin²θ = (λ² / 4a²) Q, so every candidate structure of every
+pattern is a straight-line fit. Instead of one linregress call per fit, all fits
+are padded into (patterns, structures, reflections) arrays and solved together
+with the closed-form least-squares solution.
+"""
+
+import numpy as np
+
+def fit_lines(x, y, mask=None):
+    """
+    Least-squares straight lines y = slope * x + intercept along the last axis.
+    x and y broadcast against each other; mask (same shape) marks the points that
+    take part in each fit. Fits with fewer than two distinct x values are NaN.
+    Returns:
+      slope, intercept, r_squared: arrays with the leading (batch) shape.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    w = np.ones(x.shape) if mask is None else np.broadcast_to(mask, x.shape).astype(float)
+    x = np.where(w > 0, x, 0.0)
+    y = np.where(w > 0, y, 0.0)
+    n = w.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = (w * x).sum(axis=-1) / n
+        y_mean = (w * y).sum(axis=-1) / n
+        dx = w * (x - x_mean[..., None])
+        dy = w * (y - y_mean[..., None])
+        ssxm = (dx * dx).sum(axis=-1)
+        ssym = (dy * dy).sum(axis=-1)
+        ssxym = (dx * dy).sum(axis=-1)
+        degenerate = (n < 2) | (ssxm == 0)
+        slope = np.where(degenerate, np.nan, ssxym / ssxm)
+        intercept = y_mean - slope * x_mean
+        r = np.where(ssym == 0, 1.0, ssxym / np.sqrt(ssxm * ssym))
+        r_squared = np.where(degenerate, np.nan, np.clip(r, -1.0, 1.0)**2)
+    return slope, intercept, r_squared
+
+def line_errors(x, y, slope, intercept, mask=None):
+    """
+    Standard errors of the slopes and intercepts returned by fit_lines, from the
+    residual variance with n - 2 degrees of freedom (NaN for n <= 2).
+    Returns:
+      slope_error, intercept_error, n: arrays with the leading (batch) shape.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    w = np.ones(x.shape) if mask is None else np.broadcast_to(mask, x.shape).astype(float)
+    x = np.where(w > 0, x, 0.0)
+    y = np.where(w > 0, y, 0.0)
+    n = w.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        residual = w * (y - slope[..., None] * x - intercept[..., None])
+        variance = np.where(n > 2, (residual * residual).sum(axis=-1) / (n - 2), np.nan)
+        x_mean = (w * x).sum(axis=-1) / n
+        ssxm = (w * (x - x_mean[..., None])**2).sum(axis=-1)
+        slope_error = np.sqrt(variance / ssxm)
+        intercept_error = np.sqrt(variance * (1 / n + x_mean**2 / ssxm))
+    return slope_error, intercept_error, n
+
+def fit_structures(sin2_thetas, reflection_sets, wavelength):
+    """
+    Fit every candidate structure to every pattern in one batched computation.
+    sin2_thetas is a sequence of sorted sin²θ arrays (one per pattern, any length)
+    and reflection_sets a sequence of reflection lists as returned by
+    get_allowed_reflections. As in perform_regression, the first n peaks of a
+    pattern are paired with the first n reflections, n being the shorter length.
+    Returns:
+      dict of (patterns, structures) arrays: slope, intercept, r_squared,
+      lattice_constant and n_used (number of points in each fit).
+    """
+    n_peaks = np.array([len(s) for s in sin2_thetas])
+    n_reflections = np.array([len(r) for r in reflection_sets])
+    width = int(max(n_reflections.max(initial=0), 1))
+
+    # Design arrays padded to the longest reflection list.
+    Q = np.zeros((len(reflection_sets), width))
+    for j, reflections in enumerate(reflection_sets):
+        Q[j, :len(reflections)] = [q for q, _ in reflections]
+    sin2 = np.zeros((len(sin2_thetas), width))
+    for i, s in enumerate(sin2_thetas):
+        m = min(len(s), width)
+        sin2[i, :m] = s[:m]
+
+    n_used = np.minimum(n_peaks[:, None], n_reflections[None, :])
+    mask = np.arange(width) < n_used[..., None]
+    slope, intercept, r_squared = fit_lines(Q[None, :, :], sin2[:, None, :], mask)
+    with np.errstate(invalid='ignore'):
+        # a = λ/(2*sqrt(slope))
+        lattice_constant = wavelength / (2 * np.sqrt(slope))
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'r_squared': r_squared,
+        'lattice_constant': lattice_constant,
+        'n_used': n_used,
+    }
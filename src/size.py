@@ -0,0 +1,126 @@
+"""
+Crystallite size and microstrain from peak widths.
+
+Scherrer equation, per peak:
+  D = K λ / (β cos θ)
+Williamson–Hall analysis, over all peaks of a pattern:
+  linear     β cos θ = K λ / D + ε (4 sin θ)           (Lorentzian broadening)
+  quadratic  (β cos θ)² = (K λ / D)² + ε² (4 sin θ)²   (Gaussian broadening,
+             the modified W–H plot)
+with β the FWHM in radians (2θ scale) after removing the instrumental
+broadening. Every argument broadcasts, so the peaks of one pattern or a
+(patterns, peaks) table of a whole series (NaN for missing peaks) are handled
+in one call.
+"""
+
+from typing import NamedTuple
+import numpy as np
+from src.regression import fit_lines, line_errors
+
+SCHERRER_K = 0.94
+
+# How the instrumental width is removed from the observed one:
+#   quadratic  β² = β_obs² - β_inst² (Gaussian profiles),
+#   linear     β = β_obs - β_inst (Lorentzian profiles).
+CORRECTIONS = ('quadratic', 'linear')
+
+WH_MODELS = ('linear', 'quadratic')
+
+class ScherrerSizes(NamedTuple):
+    sizes: np.ndarray
+    size_errors: np.ndarray
+    widths: np.ndarray
+
+class WilliamsonHall(NamedTuple):
+    sizes: np.ndarray
+    strains: np.ndarray
+    size_intervals: np.ndarray
+    strain_intervals: np.ndarray
+    r_squared: np.ndarray
+    n_peaks: np.ndarray
+
+def sample_broadening(fwhm, instrumental_fwhm=None, fwhm_errors=0.0, correction='quadratic'):
+    """
+    Width due to the sample alone, in the units of fwhm. Widths not larger than
+    the instrumental one become NaN.
+    Returns:
+      the corrected widths and their standard errors.
+    """
+    fwhm = np.asarray(fwhm, dtype=float)
+    fwhm_errors = np.asarray(fwhm_errors, dtype=float)
+    if instrumental_fwhm is None:
+        return fwhm, np.broadcast_to(fwhm_errors, fwhm.shape).copy()
+    if correction not in CORRECTIONS:
+        raise ValueError(f"correction must be one of {', '.join(CORRECTIONS)}.")
+    instrumental = np.asarray(instrumental_fwhm, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if correction == 'quadratic':
+            width = np.sqrt(fwhm**2 - instrumental**2)
+            width_errors = fwhm * fwhm_errors / width
+        else:
+            width = fwhm - instrumental
+            width_errors = np.broadcast_to(fwhm_errors, width.shape).copy()
+    unresolved = ~(width > 0)
+    return np.where(unresolved, np.nan, width), np.where(unresolved, np.nan, width_errors)
+
+def scherrer_sizes(two_theta, fwhm, wavelength, K=SCHERRER_K, fwhm_errors=0.0, position_errors=0.0,
+                   instrumental_fwhm=None, correction='quadratic'):
+    """
+    Scherrer crystallite sizes of peaks at two_theta (degrees) with widths fwhm
+    (degrees 2θ), in the units of wavelength. instrumental_fwhm (degrees 2θ,
+    scalar or per peak) is removed first as set by correction. Errors are
+    propagated from the width and position errors (degrees).
+    Returns:
+      ScherrerSizes of sizes, their standard errors and the sample widths used
+      (degrees 2θ); NaN where the peak is not broader than the instrument.
+    """
+    theta = np.deg2rad(np.asarray(two_theta, dtype=float)) / 2
+    width, width_errors = sample_broadening(fwhm, instrumental_fwhm, fwhm_errors, correction)
+    beta = np.deg2rad(width)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sizes = K * wavelength / (beta * np.cos(theta))
+        # dD/dβ = -D/β and dD/dθ = D tan θ, with σθ = σ(2θ) / 2.
+        relative = np.hypot(width_errors / width,
+                            np.tan(theta) * np.deg2rad(np.asarray(position_errors, dtype=float)) / 2)
+    return ScherrerSizes(sizes, sizes * relative, width)
+
+def williamson_hall(two_theta, fwhm, wavelength, K=SCHERRER_K, model='linear', instrumental_fwhm=None,
+                    correction='quadratic', confidence=0.95):
+    """
+    Williamson–Hall size and microstrain of every pattern. two_theta and fwhm
+    (degrees) have shape (..., peaks), NaN marking missing peaks;
+    instrumental_fwhm and correction are as in scherrer_sizes and model is one
+    of WH_MODELS. Confidence intervals follow from Student's t on the line fit
+    (at least three peaks) and are mapped through the size and strain formulas,
+    so the size interval is asymmetric and open-ended (inf) when the intercept
+    interval reaches zero.
+    Returns:
+      WilliamsonHall of sizes (units of wavelength), strains, their (..., 2)
+      intervals, the R² of the line fits and the number of peaks used; NaN
+      where the fit is undefined or unphysical.
+    """
+    from scipy.stats import t as student_t
+    if model not in WH_MODELS:
+        raise ValueError(f"model must be one of {', '.join(WH_MODELS)}.")
+    theta = np.deg2rad(np.asarray(two_theta, dtype=float)) / 2
+    width, _ = sample_broadening(fwhm, instrumental_fwhm, correction=correction)
+    x = 4 * np.sin(theta)
+    y = np.deg2rad(width) * np.cos(theta)
+    if model == 'quadratic':
+        x, y = x * x, y * y
+    mask = np.isfinite(x) & np.isfinite(y)
+    slope, intercept, r_squared = fit_lines(x, y, mask)
+    slope_error, intercept_error, n = line_errors(x, y, slope, intercept, mask)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spread = student_t.ppf((1 + confidence) / 2, n - 2)
+        intercepts = intercept[..., None] + np.array([1, -1]) * (spread * intercept_error)[..., None]
+        slopes = slope[..., None] + np.array([-1, 1]) * (spread * slope_error)[..., None]
+        if model == 'quadratic':
+            # D = Kλ / √intercept and ε = √slope.
+            intercept, intercepts = np.sqrt(intercept), np.sqrt(np.maximum(intercepts, 0))
+            slope, slopes = np.sqrt(slope), np.sqrt(np.maximum(slopes, 0))
+        sizes = np.where(intercept > 0, K * wavelength / intercept, np.nan)
+        size_intervals = np.where(intercepts > 0, K * wavelength / intercepts, np.inf)
+    size_intervals[np.isnan(spread)] = np.nan
+    slopes[np.isnan(spread)] = np.nan
+    return WilliamsonHall(sizes, slope, size_intervals, slopes, r_squared, n.astype(int))
@@ -0,0 +1,69 @@
+from itertools import islice
+import numpy as np
+
+# Comment character accepted in diffraction files. A single character keeps
+# both pandas' C parser and np.loadtxt on their fast paths.
+COMMENT = '#'
+
+def _sniff(filename):
+    """
+    Find the number of leading header lines and the column delimiter of a file.
+    Header lines are leading lines whose fields are not all numbers.
+    Returns:
+      skiprows, delimiter (None for whitespace).
+    """
+    with open(filename, 'r') as f:
+        for skiprows, line in enumerate(f):
+            line = line.split(COMMENT, 1)[0]
+            if not line.strip():
+                continue
+            delimiter = '\t' if '\t' in line else ',' if ',' in line else None
+            try:
+                fields = [float(field) for field in line.split(delimiter)]
+            except ValueError:
+                continue
+            if len(fields) < 2:
+                raise ValueError(f"{filename}: expected at least two columns (2θ, intensity)")
+            return skiprows, delimiter
+    raise ValueError(f"{filename}: no numeric data found")
+
+def read_xy(filename):
+    """
+    Read a two-column diffraction file (2θ in degrees, intensity).
+    Columns may be separated by tabs, whitespace or commas. Comment lines and
+    leading header lines are skipped, and extra columns (e.g. errors) are ignored.
+    Once the layout is sniffed the data is parsed in bulk by pandas' C parser,
+    about twice as fast as np.loadtxt on long scans. Its float conversion can
+    differ from correctly rounded values by one ulp, as pd.read_csv always did
+    in clean_data. pandas is imported here since only parsing needs it.
+    Returns:
+      two_theta, intensity: contiguous float64 arrays.
+    """
+    import pandas as pd
+    skiprows, delimiter = _sniff(filename)
+    data = pd.read_csv(filename, sep=delimiter or r'\s+', header=None, skiprows=skiprows,
+                       comment=COMMENT, usecols=[0, 1], dtype=np.float64, engine='c')
+    two_theta = np.ascontiguousarray(data[0].to_numpy())
+    intensity = np.ascontiguousarray(data[1].to_numpy())
+    return two_theta, intensity
+
+def iter_xy_chunks(filename, chunk_size=100_000):
+    """
+    Read a two-column diffraction file in chunks of at most chunk_size lines,
+    with the same format rules as read_xy. Only one chunk is held in memory.
+    Yields:
+      two_theta, intensity: contiguous float64 arrays for each chunk.
+    """
+    skiprows, delimiter = _sniff(filename)
+    with open(filename, 'r') as f:
+        for _ in islice(f, skiprows):
+            pass
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                break
+            # loadtxt warns on a chunk of only blank or comment lines, so drop them first.
+            lines = [line for line in lines if line.split(COMMENT, 1)[0].strip()]
+            if lines:
+                data = np.loadtxt(lines, dtype=np.float64, delimiter=delimiter, comments=COMMENT, ndmin=2)
+                yield np.ascontiguousarray(data[:, 0]), np.ascontiguousarray(data[:, 1])